@@ -1,9 +1,22 @@
+import time
+
+# 启动计时的起点, 用于报告首帧耗时
+STARTUP_T0 = time.perf_counter()
+
 import pygame
 import sys
 import random
 import os
 import math
-from collections import deque
+import heapq
+import json
+import argparse
+import mmap
+import struct
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 
 # Maze generation using recursive backtracker on an odd-sized grid
@@ -18,18 +31,140 @@ enemy_tex = None
 goal_tex = None
 SHOW_TEXTURE = True
 SHOW_FOG = True
+# 迷雾按格子计算视线 (墙后看不见); 关闭时使用原来的像素圆形视野
+LINE_OF_SIGHT = True
+# 缩略图模式 (M 键切换): 'off' 关闭, 'corner' 右下角小地图, 'overview' 整屏显示全图
+MINIMAP_MODES = ('off', 'corner', 'overview')
+MINIMAP = 'off'
+# 小地图最长边的像素数
+MINIMAP_SIZE = 160
+# 同时追踪玩家的敌人数量, 所有敌人共享同一个距离场
+ENEMY_COUNT = 1
+# 脏矩形渲染: 只重绘并提交发生变化的区域 (默认关闭)
+DIRTY_RECTS = False
+# 游戏逻辑的固定步长 (毫秒), 以及一帧内最多追赶的步数
+LOGIC_TICK_MS = 16
+MAX_LOGIC_STEPS = 10
+# 帧耗时分析: 启动时是否开启 (游戏中按 F3 切换, F4 导出)
+PROFILE = False
+PROFILE_DUMP_PATH = 'frame_times.csv'
+# 迷宫大小, 以及窗口最多显示的格子数; 迷宫更大时摄像机跟随玩家滚动
+MAZE_ROWS, MAZE_COLS = 31, 41
+VIEW_ROWS, VIEW_COLS = 31, 41
+# 后台预先生成的迷宫数量, 按 N 时直接取用; 0 表示不预取
+PREFETCH_MAZES = 2
+# 迷宫生成算法: 'backtracker' (递归回溯) 或 'eller' (逐行生成, 只需 O(列数) 的状态)
+MAZE_ALGORITHMS = ('backtracker', 'eller')
+MAZE_ALGORITHM = 'backtracker'
+# 节点数不超过这个值时才值得用 JunctionGraph.build_table() (距离表占 4 * 节点数^2 字节)
+GRAPH_TABLE_MAX_NODES = 512
+camera = None
+
+# 各贴图的候选文件名, 按顺序查找
+WALL_TEXTURE_FILES = ['wall_texture.png']
+PLAYER_TEXTURE_FILES = ['player.png', 'player_texture.png', 'player_sprite.png']
+ENEMY_TEXTURE_FILES = ['enemy.png', 'enemy_texture.png', 'enemy_sprite.png', 'monster.png']
+GOAL_TEXTURE_FILES = ['goal.png', 'exit.png', 'goal_texture.png', 'exit_texture.png', 'flag.png']
+# 字体按顺序匹配, 匹配结果缓存到磁盘, 下次启动不用再扫描系统字体目录
+FONT_NAMES = ['microsoftyahei', 'simsun']
+FONT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'maze_chase', 'fonts.json')
+
+# 终点闪烁动画预先生成的帧数, 以及光晕的最大半径
+GOAL_PULSE_FRAMES = 32
+GOAL_GLOW_RADIUS = int(TILE_SIZE * 1.8) + 1
+
+
+class AssetManager:
+    """统一的贴图管理: 每个文件只加载并 convert 一次, 每个尺寸只缩放一次"""
+
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+        self.images = {}
+        self.scaled = {}
+        self.animations = {}
+        self.pending = {}
+        self.executor = None
+
+    def path(self, filename):
+        return os.path.join(self.base_dir, filename)
+
+    def preload(self, filenames):
+        """在后台线程里读取并解码图片文件, 与迷宫生成、窗口创建同时进行"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='assets')
+        for filename in filenames:
+            path = self.path(filename)
+            if path not in self.pending and os.path.exists(path):
+                self.pending[path] = self.executor.submit(pygame.image.load, path)
+
+    def image(self, path, alpha=True):
+        """加载原图并转换成显示格式, 之后每次 blit 都不需要再转换像素格式"""
+        surf = self.images.get((path, alpha))
+        if surf is None:
+            future = self.pending.pop(path, None)
+            surf = future.result() if future is not None else pygame.image.load(path)
+            if pygame.display.get_surface() is not None:
+                surf = surf.convert_alpha() if alpha else surf.convert()
+            self.images[(path, alpha)] = surf
+        return surf
+
+    def load(self, filenames, size, alpha=True):
+        """按顺序尝试候选文件, 返回 (缩放后的贴图, 路径); 都找不到时返回 (None, None)"""
+        for filename in filenames:
+            path = self.path(filename)
+            if not os.path.exists(path):
+                continue
+            try:
+                key = (path, size, alpha)
+                if key not in self.scaled:
+                    self.scaled[key] = pygame.transform.scale(self.image(path, alpha), size)
+                return self.scaled[key], path
+            except Exception as e:
+                print(f"[debug] Failed to load {filename}:", e)
+        return None, None
+
+    def animation(self, key, count, render):
+        """缓存一组动画帧, render(i) 生成第 i 帧"""
+        frames = self.animations.get(key)
+        if frames is None:
+            frames = self.animations[key] = [render(i) for i in range(count)]
+        return frames
+
+
+assets = AssetManager()
+
+
+def resolve_font_path(names=FONT_NAMES, cache_path=FONT_CACHE_PATH):
+    """返回第一个已安装字体的文件路径 (None 表示用 pygame 默认字体), 结果缓存在磁盘上"""
+    key = ','.join(names)
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    path = cache.get(key, '')
+    if path is None or (path and os.path.exists(path)):
+        return path
+
+    # 只在缓存缺失或失效时扫描一次系统字体
+    path = pygame.font.match_font(names)
+    cache[key] = path
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print("[debug] Failed to write font cache:", e)
+    return path
+
 
 def load_wall_texture():
     global wall_tex
-    try:
-        tex_path = os.path.join(os.path.dirname(__file__), 'wall_texture.png')
-    except Exception:
-        tex_path = 'wall_texture.png'
+    tex_path = assets.path(WALL_TEXTURE_FILES[0])
 
     try:
         if os.path.exists(tex_path):
-            wall_tex = pygame.image.load(tex_path)
-            wall_tex = pygame.transform.scale(wall_tex, (TILE_SIZE, TILE_SIZE))
+            wall_tex, _ = assets.load(WALL_TEXTURE_FILES, (TILE_SIZE, TILE_SIZE), alpha=False)
             print(f"[debug] Loaded wall texture from {tex_path}, size={wall_tex.get_size()}")
         else:
             # generate a simple procedural texture and save
@@ -39,10 +174,10 @@ def load_wall_texture():
                 c = 60 + (i % 8) * 2
                 pygame.draw.line(surf, (c, c, c), (i, 0), (0, i), 1)
             wall_tex = surf
-            try:
-                pygame.image.save(surf, tex_path)
-            except Exception:
-                pass
+            # 写盘不阻塞启动
+            if assets.executor is None:
+                assets.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='assets')
+            assets.executor.submit(pygame.image.save, surf.copy(), tex_path)
             print(f"[debug] Generated wall texture and saved to {tex_path}")
     except Exception as e:
         wall_tex = None
@@ -52,74 +187,193 @@ def load_wall_texture():
 def load_player_texture():
     """加载玩家贴图，支持 player.png 或 player_texture.png"""
     global player_tex
-    for filename in ['player.png', 'player_texture.png', 'player_sprite.png']:
-        try:
-            tex_path = os.path.join(os.path.dirname(__file__), filename)
-        except Exception:
-            tex_path = filename
-        
-        try:
-            if os.path.exists(tex_path):
-                player_tex = pygame.image.load(tex_path)
-                player_tex = pygame.transform.scale(player_tex, (TILE_SIZE - 4, TILE_SIZE - 4))
-                print(f"[debug] Loaded player texture from {tex_path}")
-                return
-        except Exception as e:
-            print(f"[debug] Failed to load {filename}:", e)
-    
-    print("[debug] No player texture found, will use default shape")
+    player_tex, tex_path = assets.load(PLAYER_TEXTURE_FILES, (TILE_SIZE - 4, TILE_SIZE - 4))
+    if player_tex:
+        print(f"[debug] Loaded player texture from {tex_path}")
+    else:
+        print("[debug] No player texture found, will use default shape")
 
 
 def load_enemy_texture():
     """加载敌人贴图，支持 enemy.png 或 enemy_texture.png"""
     global enemy_tex
-    for filename in ['enemy.png', 'enemy_texture.png', 'enemy_sprite.png', 'monster.png']:
-        try:
-            tex_path = os.path.join(os.path.dirname(__file__), filename)
-        except Exception:
-            tex_path = filename
-        
-        try:
-            if os.path.exists(tex_path):
-                enemy_tex = pygame.image.load(tex_path)
-                enemy_tex = pygame.transform.scale(enemy_tex, (TILE_SIZE - 4, TILE_SIZE - 4))
-                print(f"[debug] Loaded enemy texture from {tex_path}")
-                return
-        except Exception as e:
-            print(f"[debug] Failed to load {filename}:", e)
-    
-    print("[debug] No enemy texture found, will use default shape")
+    enemy_tex, tex_path = assets.load(ENEMY_TEXTURE_FILES, (TILE_SIZE - 4, TILE_SIZE - 4))
+    if enemy_tex:
+        print(f"[debug] Loaded enemy texture from {tex_path}")
+    else:
+        print("[debug] No enemy texture found, will use default shape")
 
 
 def load_goal_texture():
     """加载终点贴图，支持 goal.png 或 exit.png"""
     global goal_tex
-    for filename in ['goal.png', 'exit.png', 'goal_texture.png', 'exit_texture.png', 'flag.png']:
-        try:
-            tex_path = os.path.join(os.path.dirname(__file__), filename)
-        except Exception:
-            tex_path = filename
-        
-        try:
-            if os.path.exists(tex_path):
-                goal_tex = pygame.image.load(tex_path)
-                goal_tex = pygame.transform.scale(goal_tex, (TILE_SIZE - 4, TILE_SIZE - 4))
-                print(f"[debug] Loaded goal texture from {tex_path}")
-                return
-        except Exception as e:
-            print(f"[debug] Failed to load {filename}:", e)
-    
-    print("[debug] No goal texture found, will use default shape")
+    goal_tex, tex_path = assets.load(GOAL_TEXTURE_FILES, (TILE_SIZE - 4, TILE_SIZE - 4))
+    if goal_tex:
+        print(f"[debug] Loaded goal texture from {tex_path}")
+    else:
+        print("[debug] No goal texture found, will use default shape")
+
+
+def as_grid(maze):
+    """Return maze as a contiguous uint8 NumPy grid (no copy if it already is one)."""
+    return np.ascontiguousarray(maze, dtype=np.uint8)
+
+
+def maze_to_list(maze):
+    """List-of-lists view of a maze grid, for code that still wants plain lists."""
+    return as_grid(maze).tolist()
+
+
+def _cells(grid):
+    # flat, fast-to-index view of a grid for the Python-level search loops
+    return memoryview(grid).cast('B')
 
 
-def make_maze(rows=31, cols=31, extra_passages=0):
-    """Generate a maze where 1=wall, 0=path. rows and cols should be odd numbers."""
+def open_mask(maze):
+    """Boolean grid that is True for every cell that is not a wall."""
+    return as_grid(maze) != 1
+
+
+def neighbor_counts(maze):
+    """Number of open 4-neighbors of every cell."""
+    mask = np.pad(open_mask(maze), 1).astype(np.uint8)
+    return mask[:-2, 1:-1] + mask[2:, 1:-1] + mask[1:-1, :-2] + mask[1:-1, 2:]
+
+
+def dead_ends(maze):
+    """Boolean grid of open cells with exactly one open neighbor."""
+    return open_mask(maze) & (neighbor_counts(maze) == 1)
+
+
+def wall_tiles(maze):
+    """(N, 2) array of the (row, col) of every wall cell, in row-major order."""
+    return np.argwhere(as_grid(maze) == 1)
+
+
+def carve_extra_passages(maze, count, rng=None, graph=None):
+    """Knock down `count` random walls next to room cells to add loops (in place).
+
+    If a JunctionGraph of the maze is given it is patched for every opened wall.
+    """
+    grid = as_grid(maze)
+    rows, cols = grid.shape
+    if count <= 0 or rows < 3 or cols < 3:
+        return grid
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(32))
+    r = 1 + 2 * rng.integers(0, (rows - 1) // 2, count)
+    c = 1 + 2 * rng.integers(0, (cols - 1) // 2, count)
+    d = rng.integers(0, 4, count)
+    wr = r + np.array((1, -1, 0, 0))[d]
+    wc = c + np.array((0, 0, 1, -1))[d]
+    ok = (0 < wr) & (wr < rows) & (0 < wc) & (wc < cols)
+    if graph is not None:
+        opened = np.unique((wr * cols + wc)[ok & (grid[wr, wc] == 1)])
+    grid[wr[ok], wc[ok]] = 0
+    if graph is not None:
+        for i in opened.tolist():
+            graph.open_cell(*divmod(i, cols))
+    return grid
+
+
+def maze_rows(cols, rows=None, extra_per_row=0.0, seed=None):
+    """Generate a maze one grid row at a time with Eller's algorithm.
+
+    Yields uint8 NumPy rows of length cols (1=wall, 0=path): the top border,
+    then alternating room rows and the wall rows below them, and the bottom
+    border once `rows` rows are done. With rows=None it never ends, for
+    endless mazes. Only O(cols) state is kept between rows.
+
+    extra_per_row walls (on average) are knocked down in every room row and
+    the wall row below it to add loops, like carve_extra_passages does.
+    """
+    rng = random if seed is None else random.Random(seed)
+    if cols % 2 == 0:
+        cols += 1
+    n = (cols - 1) // 2
+    room_rows = None if rows is None else max(1, (rows + (rows % 2 == 0) - 1) // 2)
+    border = np.ones(cols, dtype=np.uint8)
+    yield border.copy()
+
+    sets = [-1] * n   # set of every room in the current row, -1 for new rooms
+    quota = 0.0
+    i = 0
+    while room_rows is None or i < room_rows:
+        last = room_rows is not None and i == room_rows - 1
+        # renumber the sets carried down from the previous row to 0..k-1, then add new ones
+        ids = {}
+        for j in range(n):
+            if sets[j] < 0:
+                sets[j] = len(ids) + n
+            sets[j] = ids.setdefault(sets[j], len(ids))
+        parent = list(range(len(ids)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        row = bytearray(b'\x01') * cols
+        row[1::2] = bytes(n)
+        # join neighbors in different sets at random; the last row joins them all
+        for j in range(n - 1):
+            a, b = find(sets[j]), find(sets[j + 1])
+            if a != b and (last or rng.random() < 0.5):
+                row[2 * j + 2] = 0
+                parent[b] = a
+        below = bytearray(b'\x01') * cols
+        next_sets = [-1] * n
+        if not last:
+            # every set continues down through at least one room
+            groups = {}
+            for j in range(n):
+                groups.setdefault(find(sets[j]), []).append(j)
+            for root, members in groups.items():
+                drops = [j for j in members if rng.random() < 0.5] or [rng.choice(members)]
+                for j in drops:
+                    below[2 * j + 1] = 0
+                    next_sets[j] = root
+        # extra passages for this row; they only add loops, so the sets stay as they are
+        quota += extra_per_row
+        while quota >= 1:
+            quota -= 1
+            j = rng.randrange(n)
+            if rng.random() < 0.5:
+                if j < n - 1:
+                    row[2 * j + 2] = 0
+            elif not last:
+                below[2 * j + 1] = 0
+        yield np.frombuffer(row, dtype=np.uint8)
+        if not last:
+            yield np.frombuffer(below, dtype=np.uint8)
+        sets = next_sets
+        i += 1
+    yield border
+
+
+def make_maze(rows=31, cols=31, extra_passages=0, seed=None, algorithm=None):
+    """Generate a maze where 1=wall, 0=path. rows and cols should be odd numbers.
+
+    The result is a contiguous uint8 NumPy grid; use maze_to_list() for a
+    list-of-lists copy. The same seed always gives the same maze; without one
+    the global random module is used. algorithm is one of MAZE_ALGORITHMS
+    (default MAZE_ALGORITHM).
+    """
+    algorithm = algorithm or MAZE_ALGORITHM
+    if algorithm == 'eller':
+        room_rows = max(1, (rows + (rows % 2 == 0) - 1) // 2)
+        return np.vstack(list(maze_rows(cols, rows, extra_passages / room_rows, seed)))
+    if algorithm != 'backtracker':
+        raise ValueError(f"unknown maze algorithm {algorithm!r}, expected one of {MAZE_ALGORITHMS}")
+    rng = random if seed is None else random.Random(seed)
     if rows % 2 == 0:
         rows += 1
     if cols % 2 == 0:
         cols += 1
 
-    maze = [[1 for _ in range(cols)] for _ in range(rows)]
+    # carve on a flat bytearray, which is much faster to index than numpy
+    maze = bytearray(b'\x01') * (rows * cols)
 
     def neighbors(r, c):
         for dr, dc in ((-2, 0), (2, 0), (0, -2), (0, 2)):
@@ -129,76 +383,698 @@ def make_maze(rows=31, cols=31, extra_passages=0):
 
     stack = []
     start = (1, 1)
-    maze[start[0]][start[1]] = 0
+    maze[start[0] * cols + start[1]] = 0
     stack.append(start)
 
     while stack:
         r, c = stack[-1]
-        nbrs = [n for n in neighbors(r, c) if maze[n[0]][n[1]] == 1]
+        nbrs = [n for n in neighbors(r, c) if maze[n[0] * cols + n[1]] == 1]
         if nbrs:
-            nr, nc = random.choice(nbrs)
+            nr, nc = rng.choice(nbrs)
             # knock down wall between
-            wall_r, wall_c = (r + nr) // 2, (c + nc) // 2
-            maze[wall_r][wall_c] = 0
-            maze[nr][nc] = 0
+            maze[(r + nr) // 2 * cols + (c + nc) // 2] = 0
+            maze[nr * cols + nc] = 0
             stack.append((nr, nc))
         else:
             stack.pop()
 
+    grid = np.frombuffer(maze, dtype=np.uint8).reshape(rows, cols)
     # carve extra random passages to increase complexity/loops
-    for _ in range(extra_passages):
-        r = random.randrange(1, rows - 1, 2)
-        c = random.randrange(1, cols - 1, 2)
-        dir = random.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
-        wr, wc = r + dir[0], c + dir[1]
-        if 0 < wr < rows and 0 < wc < cols:
-            maze[wr][wc] = 0
+    return carve_extra_passages(grid, extra_passages, np.random.default_rng(rng.getrandbits(32)))
+
+
+class JunctionGraph:
+    """The maze's free cells (value 0) with corridors contracted into weighted edges.
+
+    Nodes are junctions, dead ends and any other cell without exactly two
+    free neighbors; each run of two-neighbor corridor cells between two nodes
+    becomes one edge whose weight is its length in steps. Searches run over
+    the nodes only, which is far fewer than the cells of a maze made of long
+    corridors. Cells are flat indices (row * cols + col).
+
+    After opening or closing a cell in the maze, call open_cell/close_cell
+    to patch the graph instead of rebuilding it.
+    """
 
-    return maze
+    def __init__(self, maze):
+        self.maze = maze
+        grid = as_grid(maze)
+        rows, cols = self.rows, self.cols = grid.shape
+        self.cells = _cells(grid)
+        free = grid == 0
+        mask = np.pad(free, 1).astype(np.uint8)
+        degree = mask[:-2, 1:-1] + mask[2:, 1:-1] + mask[1:-1, :-2] + mask[1:-1, 2:]
+        nodes = np.flatnonzero(free & (degree != 2)).tolist()
 
+        self.node = bytearray(rows * cols)
+        self.edge_of = [-1] * (rows * cols)   # corridor cell -> edge id
+        self.edge_pos = [0] * (rows * cols)   # corridor cell -> index in the edge
+        self.edges = []                       # edge id -> (a, b, corridor cells), None if removed
+        self.adj = {}                         # node -> edge ids
+        self.table = None                     # all-pairs node distances, see build_table()
+        for n in nodes:
+            self.node[n] = 1
+            self.adj[n] = []
+        corridor_cells = int(free.sum()) - len(nodes)
+        traced = 0
+        for a in nodes:
+            traced += self._trace_from(a)
+        if traced < corridor_cells:
+            # loops with no junction at all: make one cell of each a node
+            for i in np.flatnonzero(free).tolist():
+                if not self.node[i] and self.edge_of[i] == -1:
+                    self.node[i] = 1
+                    self.adj[i] = []
+                    self._trace_from(i)
 
-def find_farthest(maze, start=(1, 1)):
-    rows, cols = len(maze), len(maze[0])
-    dist = [[-1] * cols for _ in range(rows)]
+    def _neighbors(self, i):
+        cells, cols = self.cells, self.cols
+        r, c = divmod(i, cols)
+        if r > 0 and cells[i - cols] == 0:
+            yield i - cols
+        if r < self.rows - 1 and cells[i + cols] == 0:
+            yield i + cols
+        if c > 0 and cells[i - 1] == 0:
+            yield i - 1
+        if c < cols - 1 and cells[i + 1] == 0:
+            yield i + 1
+
+    def __getstate__(self):
+        # the memoryview over the grid cannot be pickled (mazes built on a process pool); rebuild it on load
+        state = self.__dict__.copy()
+        del state['cells']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cells = _cells(as_grid(self.maze))
+
+    def _trace_from(self, a):
+        """Add the edges leaving node a that are not known yet; returns corridor cells traced."""
+        node, edge_of = self.node, self.edge_of
+        traced = 0
+        for n in list(self._neighbors(a)):
+            if node[n]:
+                if a < n:
+                    self._add_edge(a, n, [])
+                continue
+            if edge_of[n] != -1:
+                continue
+            path = []
+            prev, cur = a, n
+            while not node[cur]:
+                path.append(cur)
+                edge_of[cur] = -2  # being traced
+                for nxt in self._neighbors(cur):
+                    if nxt != prev:
+                        break
+                prev, cur = cur, nxt
+            self._add_edge(a, cur, path)
+            traced += len(path)
+        return traced
+
+    def _add_edge(self, a, b, path):
+        self.table = None
+        eid = len(self.edges)
+        self.edges.append((a, b, path))
+        edge_of, edge_pos = self.edge_of, self.edge_pos
+        for j, x in enumerate(path):
+            edge_of[x] = eid
+            edge_pos[x] = j
+        self.adj[a].append(eid)
+        if b != a:
+            self.adj[b].append(eid)
+
+    def _remove_edge(self, eid):
+        self.table = None
+        a, b, path = self.edges[eid]
+        self.edges[eid] = None
+        self.adj[a].remove(eid)
+        if b != a:
+            self.adj[b].remove(eid)
+        for x in path:
+            self.edge_of[x] = -1
+
+    def _make_node(self, i):
+        """Turn cell i into a node, splitting the corridor it lies on."""
+        if self.node[i]:
+            return
+        eid = self.edge_of[i]
+        self.node[i] = 1
+        self.adj[i] = []
+        if eid < 0:
+            return
+        a, b, path = self.edges[eid]
+        j = self.edge_pos[i]
+        self._remove_edge(eid)
+        self._add_edge(a, i, path[:j])
+        self._add_edge(i, b, path[j + 1:])
+
+    def open_cell(self, r, c):
+        """Patch the graph after the wall at (r, c) was opened in the maze."""
+        i = r * self.cols + c
+        if self.node[i] or self.edge_of[i] >= 0:
+            return
+        self._make_node(i)
+        for n in self._neighbors(i):
+            self._make_node(n)
+            self._add_edge(i, n, [])
+
+    def close_cell(self, r, c):
+        """Patch the graph after (r, c) stopped being a free cell (e.g. became the exit)."""
+        i = r * self.cols + c
+        if not self.node[i] and self.edge_of[i] < 0:
+            return
+        self._make_node(i)
+        for eid in list(self.adj[i]):
+            a, b, path = self.edges[eid]
+            self._remove_edge(eid)
+            if not path:
+                continue
+            # the corridor now ends next to i: its first cell becomes a dead end
+            if a != i:
+                a, b, path = b, a, path[::-1]
+            end = path[0]
+            self.node[end] = 1
+            self.adj[end] = []
+            if b == i:
+                # a loop through i: both ends of the corridor become dead ends
+                if len(path) > 1:
+                    self.node[path[-1]] = 1
+                    self.adj[path[-1]] = []
+                    self._add_edge(end, path[-1], path[1:-1])
+            else:
+                self._add_edge(end, b, path[1:])
+        del self.adj[i]
+        self.node[i] = 0
+
+    def attach(self, i):
+        """(node, steps) pairs linking cell i to the graph."""
+        if self.node[i]:
+            return ((i, 0),)
+        eid = self.edge_of[i]
+        if eid < 0:
+            return ()
+        a, b, path = self.edges[eid]
+        j = self.edge_pos[i]
+        return ((a, j + 1), (b, len(path) - j))
+
+    def dijkstra(self, i, toward=None):
+        """Dijkstra from cell i; yields (node, steps) for every reachable node.
+
+        Without `toward` nodes come in order of increasing steps. With a cell
+        index it runs as A* (Manhattan distance to that cell), so nodes near
+        it come out early; the steps of every yielded node are still exact.
+        """
+        edges, adj, cols = self.edges, self.adj, self.cols
+        # weight 0 turns the heuristic off (plain Dijkstra)
+        w, tr, tc = (0, 0, 0) if toward is None else (1, *divmod(toward, cols))
+        done = set()
+        heap = [(d + w * (abs(n // cols - tr) + abs(n % cols - tc)), d, n) for n, d in self.attach(i)]
+        heapq.heapify(heap)
+        while heap:
+            _, d, n = heapq.heappop(heap)
+            if n in done:
+                continue
+            done.add(n)
+            yield n, d
+            for eid in adj[n]:
+                a, b, path = edges[eid]
+                m = b if a == n else a
+                if m not in done:
+                    g = d + len(path) + 1
+                    heapq.heappush(heap, (g + w * (abs(m // cols - tr) + abs(m % cols - tc)), g, m))
+
+    def distances(self, i):
+        """{node: steps} from cell i for every reachable node."""
+        return dict(self.dijkstra(i))
+
+    def build_table(self):
+        """Precompute steps between every pair of nodes (Floyd-Warshall in NumPy).
+
+        Afterwards table_distance() answers any cell-to-cell query in a few
+        lookups. Memory and time grow with nodes squared and cubed, so this is
+        only meant for small mazes; patching the graph drops the table.
+        """
+        index = {n: k for k, n in enumerate(self.adj)}
+        unreachable = np.iinfo(np.int32).max // 2
+        table = np.full((len(index), len(index)), unreachable, np.int32)
+        np.fill_diagonal(table, 0)
+        for edge in self.edges:
+            if edge is not None:
+                ka, kb, w = index[edge[0]], index[edge[1]], len(edge[2]) + 1
+                if w < table[ka, kb]:
+                    table[ka, kb] = table[kb, ka] = w
+        for k in range(len(index)):
+            np.minimum(table, table[:, k, None] + table[None, k, :], out=table)
+        table[table >= unreachable] = -1
+        self.table = (index, table)
+        return self.table
+
+    def table_distance(self, i, target):
+        """Steps from cell i to cell target using build_table(); -1 if unreachable."""
+        if i == target:
+            return 0
+        index, table = self.table
+        ends = [(index[n], d) for n, d in self.attach(target)]
+        best = -1
+        for n, d in self.attach(i):
+            row = table[index[n]]
+            for k, e in ends:
+                steps = int(row[k])
+                if steps >= 0 and (best < 0 or d + steps + e < best):
+                    best = d + steps + e
+        eid = self.edge_of[i]
+        if eid >= 0 and eid == self.edge_of[target]:
+            direct = abs(self.edge_pos[i] - self.edge_pos[target])
+            best = direct if best < 0 else min(best, direct)
+        return best
+
+    def distance(self, i, target, dist):
+        """Steps from cell i to `target`, given dist = distances(target); -1 if unreachable."""
+        if i == target:
+            return 0
+        best = min((d + dist[n] for n, d in self.attach(i) if n in dist), default=-1)
+        eid = self.edge_of[i]
+        if eid >= 0 and eid == self.edge_of[target]:
+            # both on the same corridor: walking straight along it may be shorter
+            direct = abs(self.edge_pos[i] - self.edge_pos[target])
+            best = direct if best < 0 else min(best, direct)
+        return best
+
+    def farthest(self, i):
+        """Free cell farthest from cell i, as a flat index."""
+        dist = self.distances(i)
+        far, far_dist = i, 0
+        for n, d in dist.items():
+            if d > far_dist:
+                far, far_dist = n, d
+        start_edge = -1 if self.node[i] else self.edge_of[i]
+        for eid, edge in enumerate(self.edges):
+            if edge is None or edge[0] not in dist or not edge[2]:
+                continue
+            a, b, path = edge
+            da, db, m = dist[a], dist[b], len(path)
+            if eid == start_edge:
+                for x in path:
+                    d = self.distance(x, i, dist)
+                    if d > far_dist:
+                        far, far_dist = x, d
+                continue
+            # along the corridor the distance rises from a, then falls towards b
+            peak = (db + m - da - 1) // 2
+            for j in (peak, peak + 1):
+                if 0 <= j < m:
+                    d = min(da + j + 1, db + m - j)
+                    if d > far_dist:
+                        far, far_dist = path[j], d
+        return far
+
+
+def find_farthest(maze, start=(1, 1), graph=None):
+    """Free cell farthest (in steps) from start; uses graph (a JunctionGraph of maze) if given."""
+    if graph is not None:
+        return divmod(graph.farthest(start[0] * graph.cols + start[1]), graph.cols)
+    grid = as_grid(maze)
+    rows, cols = grid.shape
+    cells = _cells(grid)
+    dist = [-1] * (rows * cols)
     q = deque()
     q.append(start)
-    dist[start[0]][start[1]] = 0
-    far = start
+    dist[start[0] * cols + start[1]] = 0
+    far, far_dist = start, 0
     while q:
         r, c = q.popleft()
+        d = dist[r * cols + c] + 1
         for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1)):
             rr, cc = r + dr, c + dc
-            if 0 <= rr < rows and 0 <= cc < cols and maze[rr][cc] == 0 and dist[rr][cc] == -1:
-                dist[rr][cc] = dist[r][c] + 1
+            i = rr * cols + cc
+            if 0 <= rr < rows and 0 <= cc < cols and cells[i] == 0 and dist[i] == -1:
+                dist[i] = d
                 q.append((rr, cc))
-                if dist[rr][cc] > dist[far[0]][far[1]]:
-                    far = (rr, cc)
+                if d > far_dist:
+                    far, far_dist = (rr, cc), d
     return far
 
 
+class Camera:
+    """视口摄像机: 记录视口左上角在迷宫中的像素位置, 跟随玩家滚动"""
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.x = self.y = 0
+
+    def follow(self, cell, maze_shape):
+        """把玩家放在视口中央 (不超出迷宫边界), 返回视口是否移动"""
+        rows, cols = maze_shape
+        x = cell[1] * TILE_SIZE + TILE_SIZE // 2 - self.width // 2
+        y = cell[0] * TILE_SIZE + TILE_SIZE // 2 - self.height // 2
+        x = max(0, min(x, cols * TILE_SIZE - self.width))
+        y = max(0, min(y, rows * TILE_SIZE - self.height))
+        moved = (x, y) != (self.x, self.y)
+        self.x, self.y = x, y
+        return moved
+
+
+def camera_offset():
+    return (camera.x, camera.y) if camera is not None else (0, 0)
+
+
 def to_display_coords(cell):
     r, c = cell
-    # apply vertical offset so UI bar doesn't cover the maze
-    return c * TILE_SIZE, r * TILE_SIZE + OFFSET_Y
-
-
-def draw_maze(screen, maze):
-    rows, cols = len(maze), len(maze[0])
-    for r in range(rows):
-        for c in range(cols):
-            rect = pygame.Rect(c * TILE_SIZE, r * TILE_SIZE + OFFSET_Y, TILE_SIZE, TILE_SIZE)
-            if maze[r][c] == 1:
-                # textured wall
-                if SHOW_TEXTURE and wall_tex:
-                    screen.blit(wall_tex, (c * TILE_SIZE, r * TILE_SIZE + OFFSET_Y))
-                else:
-                    pygame.draw.rect(screen, (40, 40, 40), rect)
-                # subtle shadow at bottom-right
-                shadow = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-                pygame.draw.polygon(shadow, (0, 0, 0, 40), [(TILE_SIZE, TILE_SIZE*0.6), (TILE_SIZE, TILE_SIZE), (TILE_SIZE*0.6, TILE_SIZE)])
-                screen.blit(shadow, (c * TILE_SIZE, r * TILE_SIZE + OFFSET_Y))
-            else:
-                pygame.draw.rect(screen, (230, 230, 230), rect)
+    cam_x, cam_y = camera_offset()
+    # apply vertical offset so UI bar doesn't cover the maze, and scroll with the camera
+    return c * TILE_SIZE - cam_x, r * TILE_SIZE + OFFSET_Y - cam_y
+
+
+def draw_maze(screen, maze, offset_y=None, offset_x=0):
+    """Draw the maze with cell (0, 0) at (offset_x, offset_y).
+
+    Only the tiles that intersect the screen's clip rect are drawn.
+    """
+    if offset_y is None:
+        offset_y = OFFSET_Y
+    grid = as_grid(maze)
+    rows, cols = grid.shape
+    clip = screen.get_clip()
+    r0 = max(0, (clip.top - offset_y) // TILE_SIZE)
+    r1 = min(rows, -(-(clip.bottom - offset_y) // TILE_SIZE))
+    c0 = max(0, (clip.left - offset_x) // TILE_SIZE)
+    c1 = min(cols, -(-(clip.right - offset_x) // TILE_SIZE))
+    if r0 >= r1 or c0 >= c1:
+        return
+    # floor first, then every wall tile on top of it
+    screen.fill((230, 230, 230), (c0 * TILE_SIZE + offset_x, r0 * TILE_SIZE + offset_y,
+                                  (c1 - c0) * TILE_SIZE, (r1 - r0) * TILE_SIZE))
+    walls = wall_tiles(grid[r0:r1, c0:c1]) * TILE_SIZE
+    xs = walls[:, 1] + (c0 * TILE_SIZE + offset_x)
+    ys = walls[:, 0] + (r0 * TILE_SIZE + offset_y)
+    positions = list(zip(xs.tolist(), ys.tolist()))
+    if SHOW_TEXTURE and wall_tex:
+        screen.blits([(wall_tex, pos) for pos in positions], doreturn=False)
+    else:
+        for x, y in positions:
+            pygame.draw.rect(screen, (40, 40, 40), (x, y, TILE_SIZE, TILE_SIZE))
+    # subtle shadow at bottom-right, shared by every wall tile
+    shadow = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+    pygame.draw.polygon(shadow, (0, 0, 0, 40), [(TILE_SIZE, TILE_SIZE*0.6), (TILE_SIZE, TILE_SIZE), (TILE_SIZE*0.6, TILE_SIZE)])
+    screen.blits([(shadow, pos) for pos in positions], doreturn=False)
+
+
+class MazeLayer:
+    """迷宫静态背景层: 按块预渲染并缓存, 每帧只 blit 与视口相交的几个块.
+
+    块在第一次可见时渲染, 最多缓存 MAX_CHUNKS 块, 所以很大的迷宫也不会占用大量内存.
+    """
+
+    CHUNK_TILES = 32
+    MAX_CHUNKS = 24
+
+    def __init__(self, maze=None):
+        self.grid = None
+        self.chunks = OrderedDict()
+        if maze is not None:
+            self.rebuild(maze)
+
+    def rebuild(self, maze):
+        self.grid = as_grid(maze)
+        self.chunks.clear()
+
+    def _chunk(self, key):
+        surf = self.chunks.get(key)
+        if surf is not None:
+            self.chunks.move_to_end(key)
+            return surf
+        n = self.CHUNK_TILES
+        sub = self.grid[key[0] * n:(key[0] + 1) * n, key[1] * n:(key[1] + 1) * n]
+        surf = pygame.Surface((sub.shape[1] * TILE_SIZE, sub.shape[0] * TILE_SIZE))
+        if pygame.display.get_surface() is not None:
+            surf = surf.convert()
+        draw_maze(surf, sub, offset_y=0)
+        self.chunks[key] = surf
+        while len(self.chunks) > self.MAX_CHUNKS:
+            self.chunks.popitem(last=False)
+        return surf
+
+    def draw(self, screen):
+        if self.grid is None:
+            return
+        rows, cols = self.grid.shape
+        cam_x, cam_y = camera_offset()
+        size = self.CHUNK_TILES * TILE_SIZE
+        # 屏幕裁剪区对应的迷宫像素范围
+        clip = screen.get_clip()
+        left, right = clip.left + cam_x, clip.right + cam_x
+        top, bottom = clip.top - OFFSET_Y + cam_y, clip.bottom - OFFSET_Y + cam_y
+        for cr in range(max(0, top // size), min(-(-rows // self.CHUNK_TILES), -(-bottom // size))):
+            for cc in range(max(0, left // size), min(-(-cols // self.CHUNK_TILES), -(-right // size))):
+                screen.blit(self._chunk((cr, cc)), (cc * size - cam_x, cr * size + OFFSET_Y - cam_y))
+
+
+class FogOfWar:
+    """迷雾层: 整屏遮罩只分配一次, 视野圆形遮罩也预先生成.
+
+    玩家移动时只在遮罩上补回旧的视野区域、盖上新的视野区域, 其余像素保持不变.
+    update() 返回的区域给脏矩形模式 (DIRTY_RECTS) 用, 那时 draw() 只在裁剪区内混合.
+    """
+
+    def __init__(self, size, radius=VISION_RADIUS, alpha=180):
+        self.radius = radius
+        self.alpha = alpha
+        self.overlay = pygame.Surface(size, pygame.SRCALPHA)
+        self.mask = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            self.overlay = self.overlay.convert_alpha()
+            self.mask = self.mask.convert_alpha()
+        self.overlay.fill((0, 0, 0, alpha))
+        self.mask.fill((0, 0, 0, alpha))
+        pygame.draw.circle(self.mask, (0, 0, 0, 0), (radius, radius), radius)
+        self.center = None
+        self.mask_rect = self.mask.get_rect()
+
+    def update(self, center):
+        """玩家位置变化时移动视野遮罩, 返回受影响的区域"""
+        if center == self.center:
+            return []
+        old_rect = self.mask_rect.copy()
+        self.center = center
+        self.mask_rect = self.mask.get_rect(center=center)
+        self.overlay.fill((0, 0, 0, self.alpha), old_rect)
+        # 取 alpha 最小值, 把圆形视野压进遮罩
+        self.overlay.blit(self.mask, self.mask_rect, special_flags=pygame.BLEND_RGBA_MIN)
+        return [old_rect, self.mask_rect.copy()]
+
+    def draw(self, screen):
+        # 混合范围就是 screen 的裁剪区. 默认模式整屏重绘时迷雾下面的迷宫和角色都重画了,
+        # 所以仍要整屏混合一次; 只有脏矩形模式保留了上一帧, 才能只混合变化的区域
+        screen.blit(self.overlay, (0, 0))
+
+
+# 阴影投射的 8 个八分区, 每列是 (xx, xy, yx, yy)
+_OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+
+class Visibility:
+    """按格子计算视线 (递归阴影投射), 墙不透光.
+
+    每个玩家格子的可见格子集合用 LRU 缓存 (最多 max_size 个), 迷宫不变时
+    同一个格子只计算一次; 换了新迷宫时缓存整体作废.
+    """
+
+    def __init__(self, radius=VISION_RADIUS // TILE_SIZE, max_size=512):
+        self.radius = radius
+        self.max_size = max_size
+        self.maze = None
+        self.memo = OrderedDict()
+
+    def visible(self, maze, cell):
+        """从 cell 能看到的所有格子 (包括挡住视线的墙), 返回 frozenset"""
+        if maze is not self.maze:
+            self.maze = maze
+            grid = as_grid(maze)
+            self.rows, self.cols = grid.shape
+            self.cells = _cells(grid)
+            self.memo.clear()
+        cell = tuple(cell)
+        seen = self.memo.get(cell)
+        if seen is not None:
+            self.memo.move_to_end(cell)
+            return seen
+        out = {cell}
+        for xx, xy, yx, yy in _OCTANTS:
+            self._cast(cell[0], cell[1], 1, 1.0, 0.0, xx, xy, yx, yy, out)
+        seen = self.memo[cell] = frozenset(out)
+        if len(self.memo) > self.max_size:
+            self.memo.popitem(last=False)
+        return seen
+
+    def _cast(self, cr, cc, row, start, end, xx, xy, yx, yy, out):
+        # 扫描一个八分区里第 row 行起的扇形 [start, end] (斜率), 遇到墙就把扇形分开递归
+        if start < end:
+            return
+        radius = self.radius
+        radius_sq = radius * radius + radius
+        rows, cols, cells = self.rows, self.cols, self.cells
+        new_start = start
+        for j in range(row, radius + 1):
+            dx, dy = -j - 1, -j
+            blocked = False
+            while dx <= 0:
+                dx += 1
+                r, c = cr + dx * yx + dy * yy, cc + dx * xx + dy * xy
+                left, right = (dx - 0.5) / (dy + 0.5), (dx + 0.5) / (dy - 0.5)
+                if start < right:
+                    continue
+                if end > left:
+                    break
+                inside = 0 <= r < rows and 0 <= c < cols
+                if inside and dx * dx + dy * dy <= radius_sq:
+                    out.add((r, c))
+                opaque = not inside or cells[r * cols + c] == 1
+                if blocked:
+                    if opaque:
+                        new_start = right
+                    else:
+                        blocked = False
+                        start = new_start
+                elif opaque and j < radius:
+                    blocked = True
+                    self._cast(cr, cc, j + 1, start, left, xx, xy, yx, yy, out)
+                    new_start = right
+            if blocked:
+                break
+
+
+class TileFog:
+    """按格子的迷雾层: 可见格子透明, 其余格子盖上半透明黑色.
+
+    和 FogOfWar 一样整屏遮罩只分配一次; 可见集合或摄像机变化时只补回旧的
+    可见格子、挖开新的可见格子.
+    """
+
+    def __init__(self, size, alpha=180):
+        self.alpha = alpha
+        self.overlay = pygame.Surface(size, pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            self.overlay = self.overlay.convert_alpha()
+        self.overlay.fill((0, 0, 0, alpha))
+        self.cells = None
+        self.offset = None
+        self.rects = []
+
+    def update(self, cells):
+        """换上新的可见格子集合, 返回受影响的区域"""
+        offset = camera_offset()
+        if cells is self.cells and offset == self.offset:
+            return []
+        changed = []
+        if self.rects:
+            for rect in self.rects:
+                self.overlay.fill((0, 0, 0, self.alpha), rect)
+            changed.append(self.rects[0].unionall(self.rects))
+        self.cells, self.offset = cells, offset
+        self.rects = [pygame.Rect(*to_display_coords(cell), TILE_SIZE, TILE_SIZE) for cell in cells]
+        for rect in self.rects:
+            self.overlay.fill((0, 0, 0, 0), rect)
+        if self.rects:
+            changed.append(self.rects[0].unionall(self.rects))
+        return changed
+
+    def draw(self, screen):
+        screen.blit(self.overlay, (0, 0))
+
+
+class Minimap:
+    """迷宫缩略图 (小地图或全图), 每个格子先对应一个像素, 再缩放到显示大小.
+
+    底图用 surfarray 一次写入整张迷宫, 只在换迷宫或改变大小时重建, 不再逐格画矩形.
+    玩家、敌人、终点和视口框是画在缩放后底图上的标记; 它们移动时只用底图补回
+    旧标记所在的小块区域, 再画上新标记.
+    """
+
+    # 按格子值 (0 路, 1 墙, 2 出口) 查颜色
+    PALETTE = np.array([(230, 230, 230), (40, 40, 40), (230, 230, 230)], dtype=np.uint8)
+    VIEW_COLOR = (0, 160, 255)
+    GOAL_COLOR = (255, 200, 0)
+    ENEMY_COLOR = (150, 0, 200)
+    PLAYER_COLOR = (220, 30, 30)
+
+    def __init__(self, max_size=(MINIMAP_SIZE, MINIMAP_SIZE)):
+        self.max_size = tuple(max_size)
+        self.maze = None
+        self.base = self.image = None
+        self.scale = 1.0
+        self.marks = None
+        self.rects = []
+
+    def resize(self, max_size):
+        """改变最大尺寸, 下次 update 时重建底图"""
+        max_size = tuple(max_size)
+        if max_size != self.max_size:
+            self.max_size = max_size
+            self.maze = None
+
+    def rebuild(self, maze):
+        self.maze = maze
+        grid = as_grid(maze)
+        rows, cols = grid.shape
+        # surfarray 的下标是 (x, y), 所以要把 (行, 列) 转置
+        pixels = self.PALETTE[np.minimum(grid, 2)].transpose(1, 0, 2)
+        full = pygame.surfarray.make_surface(pixels)
+        self.scale = min(self.max_size[0] / cols, self.max_size[1] / rows)
+        size = (max(1, int(cols * self.scale)), max(1, int(rows * self.scale)))
+        if self.scale >= 1:
+            # 放大时每格是清晰的方块
+            self.base = pygame.transform.scale(full, size)
+        else:
+            # 缩小时取平均, 细墙变成灰色而不是随机消失
+            self.base = pygame.transform.smoothscale(full, size)
+        if pygame.display.get_surface() is not None:
+            self.base = self.base.convert()
+        self.image = self.base.copy()
+        self.marks = None
+        self.rects = []
+
+    def cell_rect(self, cell, min_size=4):
+        """格子在缩略图上的标记矩形, 至少 min_size 像素, 缩得很小时也看得见"""
+        size = max(min_size, math.ceil(self.scale))
+        x = int((cell[1] + 0.5) * self.scale) - size // 2
+        y = int((cell[0] + 0.5) * self.scale) - size // 2
+        return pygame.Rect(x, y, size, size)
+
+    def update(self, maze, player_pos, enemies, exit_cell):
+        """把标记移到当前位置, 返回缩略图是否有变化"""
+        rebuilt = maze is not self.maze
+        if rebuilt:
+            self.rebuild(maze)
+        marks = []
+        if camera is not None:
+            # 视口框: 摄像机的像素范围换算成缩略图坐标
+            k = self.scale / TILE_SIZE
+            marks.append((pygame.Rect(int(camera.x * k), int(camera.y * k),
+                                      max(2, int(camera.width * k)), max(2, int(camera.height * k))),
+                          self.VIEW_COLOR, 1))
+        marks.append((self.cell_rect(exit_cell, 5), self.GOAL_COLOR, 0))
+        marks += [(self.cell_rect(enemy.pos), self.ENEMY_COLOR, 0) for enemy in enemies]
+        marks.append((self.cell_rect(player_pos), self.PLAYER_COLOR, 0))
+        key = [(tuple(rect), color) for rect, color, _ in marks]
+        if key == self.marks and not rebuilt:
+            return False
+        # 先用底图擦掉所有旧标记, 再按顺序画新标记, 重叠时玩家在最上面
+        for rect in self.rects:
+            self.image.blit(self.base, rect, rect)
+        for rect, color, width in marks:
+            pygame.draw.rect(self.image, color, rect, width)
+        self.marks = key
+        self.rects = [rect for rect, _, _ in marks]
+        return True
+
+    def get_rect(self, **kwargs):
+        return self.image.get_rect(**kwargs)
+
+    def draw(self, screen, rect):
+        screen.blit(self.image, rect)
 
 
 def draw_player(screen, pos):
@@ -213,89 +1089,298 @@ def draw_player(screen, pos):
         color = (200, 30, 30)
         pygame.draw.rect(screen, color, rect)
 
+class FlowField:
+    """Reverse BFS distance field rooted at the player's cell, shared by all enemies.
+
+    It is rebuilt only when the player moves (or the maze changes); every
+    enemy then picks its next step by looking at its neighbors' distances.
+    With a JunctionGraph of the same maze only the junctions get distances
+    (Dijkstra over the corridors) and cell distances are derived on demand.
+    The search itself is lazy: it runs as A* towards the first cell asked
+    about and only until the junctions around the cells asked about are
+    settled, so an enemy costs the nodes between it and the player.
+    """
+
+    def __init__(self, graph=None):
+        self.graph = graph
+        self.maze = None
+        self.target = None
+        self.dist = None
+        self.node_dist = None
+        self.search = None
+
+    def update(self, maze, target):
+        if maze is self.maze and target == self.target:
+            return
+        self.maze, self.target = maze, target
+        grid = as_grid(maze)
+        rows, cols = self.rows, self.cols = grid.shape
+        if self.graph is not None and self.graph.maze is maze:
+            # the search starts with the first query
+            self.node_dist = {}
+            self.search = None
+            self.dist = None
+            return
+        self.node_dist = self.search = None
+        cells = _cells(grid)
+        dist = [-1] * (rows * cols)
+        dist[target[0] * cols + target[1]] = 0
+        q = deque([target])
+        while q:
+            r, c = q.popleft()
+            d = dist[r * cols + c] + 1
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                rr, cc = r + dr, c + dc
+                i = rr * cols + cc
+                if 0 <= rr < rows and 0 <= cc < cols and cells[i] == 0 and dist[i] == -1:
+                    dist[i] = d
+                    q.append((rr, cc))
+        self.dist = dist
+
+    def _cell_distance(self, i):
+        if self.node_dist is None:
+            return self.dist[i]
+        target = self.target[0] * self.cols + self.target[1]
+        if self.graph.table is not None:
+            return self.graph.table_distance(i, target)
+        dist = self.node_dist
+        if self.search is None:
+            # first query since the target moved: aim the search at this cell
+            self.search = self.graph.dijkstra(target, i)
+        for n, _ in self.graph.attach(i):
+            # resume the search until n is settled (or the search is exhausted)
+            while n not in dist:
+                item = next(self.search, None)
+                if item is None:
+                    break
+                dist[item[0]] = item[1]
+        return self.graph.distance(i, target, dist)
+
+    def distance(self, pos):
+        """Steps from pos to the target, or -1 if unreachable."""
+        return self._cell_distance(pos[0] * self.cols + pos[1])
+
+    def next_step(self, pos):
+        """Return the neighbor of pos one step closer to the target (pos itself if none)."""
+        r, c = pos
+        rows, cols = self.rows, self.cols
+        d = self._cell_distance(r * cols + c)
+        if d <= 0:
+            return pos
+        for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            rr, cc = r + dr, c + dc
+            if 0 <= rr < rows and 0 <= cc < cols and self._cell_distance(rr * cols + cc) == d - 1:
+                return (rr, cc)
+        return pos
+
+
+class IncrementalPlanner:
+    """Incremental chaser pathfinder (LPA* on a static maze, rooted at the chaser).
+
+    The search tree is kept between calls. When the player moves, only the
+    keys are shifted (km) and the search resumes from where it stopped, so a
+    one-cell goal shift usually costs a handful of expansions. While the
+    chaser walks along its cached shortest path the tree stays valid, and it
+    is only re-rooted when the chaser leaves that tree. If neither endpoint
+    changed the cached path is reused without planning at all.
+    """
+
+    def __init__(self, maze):
+        self.maze = maze
+        grid = as_grid(maze)
+        self.rows, self.cols = grid.shape
+        self.cells = _cells(grid)
+        self.root = None
+        self.goal = None
+        self.path = []
+        self.path_index = 0
+
+    def _neighbors(self, cell):
+        r, c = cell
+        cells, rows, cols = self.cells, self.rows, self.cols
+        for rr, cc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= rr < rows and 0 <= cc < cols and cells[rr * cols + cc] == 0:
+                yield rr, cc
+
+    def _h(self, cell):
+        return abs(cell[0] - self.goal[0]) + abs(cell[1] - self.goal[1])
+
+    def _key(self, cell):
+        m = min(self.g.get(cell, math.inf), self.rhs.get(cell, math.inf))
+        return (m + self._h(cell) + self.km, m)
+
+    def _reset(self, root):
+        self.root = root
+        self.km = 0
+        self.g = {}
+        self.rhs = {root: 0}
+        key = self._key(root)
+        self.open = [(key, root)]
+        self.open_keys = {root: key}
+
+    def _compute(self):
+        # walls never change, so g-values only ever decrease and every
+        # expansion makes a cell consistent
+        g, rhs, open_, open_keys = self.g, self.rhs, self.open, self.open_keys
+        goal = self.goal
+        while open_:
+            key, u = open_[0]
+            if open_keys.get(u) != key:
+                heapq.heappop(open_)  # stale entry
+                continue
+            if not (key < self._key(goal) or rhs.get(goal, math.inf) != g.get(goal, math.inf)):
+                return
+            heapq.heappop(open_)
+            new_key = self._key(u)
+            if key < new_key:
+                # key is out of date after the goal moved, requeue it
+                open_keys[u] = new_key
+                heapq.heappush(open_, (new_key, u))
+                continue
+            del open_keys[u]
+            gu = g[u] = rhs[u]
+            for s in self._neighbors(u):
+                if gu + 1 < rhs.get(s, math.inf):
+                    rhs[s] = gu + 1
+                    k = self._key(s)
+                    open_keys[s] = k
+                    heapq.heappush(open_, (k, s))
+
+    def _extract(self, start):
+        """Walk from the goal back to start along cells whose g drops by one."""
+        g = self.g
+        goal_g = g.get(self.goal, math.inf)
+        start_g = g.get(start, math.inf)
+        if goal_g == math.inf or start_g > goal_g:
+            return None
+        stack = [self.goal]
+        parent = {self.goal: None}
+        while stack:
+            cell = stack.pop()
+            if cell == start:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = parent[cell]
+                return path
+            level = g[cell] - 1
+            if level < start_g:
+                continue
+            for n in self._neighbors(cell):
+                if n not in parent and g.get(n, math.inf) == level:
+                    parent[n] = cell
+                    stack.append(n)
+        # start is not on a shortest path from the root to the goal
+        return None
+
+    def next_step(self, start, goal):
+        """Return the cell the chaser at start should move to next."""
+        path, i = self.path, self.path_index
+        if path and path[-1] == goal:
+            if i + 1 < len(path) and path[i + 1] == start:
+                i = self.path_index = i + 1
+            if path[i] == start:
+                return path[i + 1] if i + 1 < len(path) else start
+
+        # cells on the cached path have exact g-values, so the tree can be kept
+        on_tree = bool(path) and start in path[i:i + 2]
+        if self.goal is not None:
+            self.km += self._h(goal)
+        self.goal = goal
+        if self.root is None or not on_tree:
+            self._reset(start)
+        self._compute()
+        new_path = self._extract(start)
+        if new_path is None and self.root != start:
+            self._reset(start)
+            self._compute()
+            new_path = self._extract(start)
+        self.path = new_path or []
+        self.path_index = 0
+        return self.path[1] if len(self.path) > 1 else start
+
+
 # Enemy/Chaser class
+def spawn_position(maze, player_pos, rng=random):
+    # Spawn enemy far from player: try 50 random room cells, keep the farthest
+    grid = as_grid(maze)
+    rows, cols = grid.shape
+    rng = np.random.default_rng(rng.getrandbits(32))
+    r = 1 + 2 * rng.integers(0, rows // 2, 50)
+    c = 1 + 2 * rng.integers(0, cols // 2, 50)
+    dist = np.abs(r - player_pos[0]) + np.abs(c - player_pos[1])
+    dist[grid[r, c] != 0] = 0
+    best = int(np.argmax(dist))
+    return (int(r[best]), int(c[best])) if dist[best] > 0 else (1, 1)
+
+
 class Enemy:
-    def __init__(self, maze, player_pos):
-        self.pos = self.get_spawn_position(maze, player_pos)
+    def __init__(self, maze, player_pos, clock=None, pos=None):
+        # clock returns milliseconds; headless simulations pass their own
+        self.clock = clock or pygame.time.get_ticks
+        # pos is a spawn cell picked in advance (see MazePrefetcher)
+        self.pos = pos if pos is not None else self.get_spawn_position(maze, player_pos)
         self.move_cooldown = 300  # Slower than player
-        self.last_move_time = pygame.time.get_ticks()
+        self.last_move_time = self.clock()
+        self.planner = None
     
     def get_spawn_position(self, maze, player_pos):
-        # Spawn enemy far from player
-        rows, cols = len(maze), len(maze[0])
-        max_dist = 0
-        best_pos = None
-        for _ in range(50):  # Try 50 random positions
-            r = random.randrange(1, rows, 2)
-            c = random.randrange(1, cols, 2)
-            if maze[r][c] == 0:
-                dist = abs(r - player_pos[0]) + abs(c - player_pos[1])
-                if dist > max_dist:
-                    max_dist = dist
-                    best_pos = (r, c)
-        return best_pos if best_pos else (1, 1)
+        return spawn_position(maze, player_pos)
     
     def can_move(self):
-        current_time = pygame.time.get_ticks()
+        current_time = self.clock()
         if current_time - self.last_move_time >= self.move_cooldown:
             self.last_move_time = current_time
             return True
         return False
     
-    def chase_player(self, maze, player_pos):
-        # Simple BFS pathfinding toward player
+    def chase_player(self, maze, player_pos, flow=None):
         if not self.can_move():
             return
-        
-        rows, cols = len(maze), len(maze[0])
-        queue = deque([(self.pos, [])])
-        visited = {self.pos}
-        
-        while queue:
-            (r, c), path = queue.popleft()
-            
-            if (r, c) == player_pos:
-                if path:  # Move one step toward player
-                    self.pos = path[0]
-                return
-            
-            for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nr, nc = r + dr, c + dc
-                if 0 <= nr < rows and 0 <= nc < cols and maze[nr][nc] == 0 and (nr, nc) not in visited:
-                    visited.add((nr, nc))
-                    queue.append(((nr, nc), path + [(nr, nc)]))
+
+        # a shared flow field already knows the distance from every cell
+        if flow is not None:
+            flow.update(maze, player_pos)
+            self.pos = flow.next_step(self.pos)
+            return
+
+        # otherwise repair the previous search instead of a fresh BFS
+        if self.planner is None or self.planner.maze is not maze:
+            self.planner = IncrementalPlanner(maze)
+        self.pos = self.planner.next_step(self.pos, player_pos)
     
     def draw(self, screen):
-        x, y = to_display_coords(self.pos)
-        
-        # 如果有敌人贴图，使用贴图
-        if enemy_tex:
-            screen.blit(enemy_tex, (x + 2, y + 2))
-        else:
-            # 否则使用默认的紫色方块
-            rect = pygame.Rect(x + 3, y + 3, TILE_SIZE - 6, TILE_SIZE - 6)
-            pygame.draw.rect(screen, (100, 0, 150), rect)
+        draw_enemy(screen, self.pos)
 
 
-def draw_goal(screen, goal_pos, current_time):
-    x, y = to_display_coords(goal_pos)
-    center_x = x + TILE_SIZE // 2
-    center_y = y + TILE_SIZE // 2
-    
-    # 闪烁效果 - 使用正弦波
-    pulse = abs(math.sin(current_time / 300))  # 300ms周期
+def draw_enemy(screen, pos):
+    x, y = to_display_coords(pos)
     
+    # 如果有敌人贴图，使用贴图
+    if enemy_tex:
+        screen.blit(enemy_tex, (x + 2, y + 2))
+    else:
+        # 否则使用默认的紫色方块
+        rect = pygame.Rect(x + 3, y + 3, TILE_SIZE - 6, TILE_SIZE - 6)
+        pygame.draw.rect(screen, (100, 0, 150), rect)
+
+
+def render_goal_frame(pulse, tex=None):
+    """生成终点某一亮度下的完整画面 (光晕 + 主体), 终点格中心位于帧中心"""
+    size = GOAL_GLOW_RADIUS * 2
+    frame = pygame.Surface((size, size), pygame.SRCALPHA)
+    center_x = center_y = GOAL_GLOW_RADIUS
+    x, y = center_x - TILE_SIZE // 2, center_y - TILE_SIZE // 2
+
     # 如果有终点贴图
-    if goal_tex:
+    if tex:
         # 绘制光晕效果
         glow_radius = int(TILE_SIZE * (1.2 + pulse * 0.3))
         glow_color = (255, 255, 0, int(100 * pulse))
-        glow_surf = pygame.Surface((glow_radius * 2, glow_radius * 2), pygame.SRCALPHA)
-        pygame.draw.circle(glow_surf, glow_color, (glow_radius, glow_radius), glow_radius)
-        screen.blit(glow_surf, (center_x - glow_radius, center_y - glow_radius))
-        
+        pygame.draw.circle(frame, glow_color, (center_x, center_y), glow_radius)
+
         # 绘制贴图
-        screen.blit(goal_tex, (x + 2, y + 2))
+        frame.blit(tex, (x + 2, y + 2))
     else:
         # 绘制光晕层
         for i in range(3):
@@ -303,99 +1388,785 @@ def draw_goal(screen, goal_pos, current_time):
             alpha = int(80 - i * 20)
             glow_surf = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
             pygame.draw.circle(glow_surf, (255, 255, 0, alpha), (radius, radius), radius)
-            screen.blit(glow_surf, (center_x - radius, center_y - radius))
-        
+            frame.blit(glow_surf, (center_x - radius, center_y - radius))
+
         # 绘制主体 - 明亮的黄色椭圆
         bright_yellow = (255, 255, int(150 + 105 * pulse))
-        pygame.draw.ellipse(screen, bright_yellow, (x + 2, y + 2, TILE_SIZE - 4, TILE_SIZE - 4))
-        
+        pygame.draw.ellipse(frame, bright_yellow, (x + 2, y + 2, TILE_SIZE - 4, TILE_SIZE - 4))
+
         # 绘制内圈高光
         highlight = (255, 255, 255, int(200 * pulse))
         highlight_surf = pygame.Surface((TILE_SIZE - 8, TILE_SIZE - 8), pygame.SRCALPHA)
         pygame.draw.ellipse(highlight_surf, highlight, (0, 0, TILE_SIZE - 8, TILE_SIZE - 8))
-        screen.blit(highlight_surf, (x + 4, y + 4))
+        frame.blit(highlight_surf, (x + 4, y + 4))
+
+    if pygame.display.get_surface() is not None:
+        frame = frame.convert_alpha()
+    return frame
+
+
+def goal_frame_index(current_time):
+    # 闪烁效果 - abs(sin(t / 300)) 的周期是 300 * pi 毫秒
+    phase = (current_time / 300) % math.pi
+    return int(phase / math.pi * GOAL_PULSE_FRAMES) % GOAL_PULSE_FRAMES
+
+
+def goal_next_frame_time(current_time):
+    """闪烁动画换到下一帧的时间 (毫秒)"""
+    frame_ms = 300 * math.pi / GOAL_PULSE_FRAMES
+    return math.ceil((math.floor(current_time / frame_ms) + 1) * frame_ms)
+
+
+def draw_goal(screen, goal_pos, current_time):
+    x, y = to_display_coords(goal_pos)
+    center_x = x + TILE_SIZE // 2
+    center_y = y + TILE_SIZE // 2
+
+    # 动画帧预先生成, 每帧只需一次 blit
+    frames = assets.animation(
+        ('goal', TILE_SIZE, id(goal_tex)), GOAL_PULSE_FRAMES,
+        lambda i: render_goal_frame(math.sin(math.pi * i / GOAL_PULSE_FRAMES), goal_tex))
+    screen.blit(frames[goal_frame_index(current_time)], (center_x - GOAL_GLOW_RADIUS, center_y - GOAL_GLOW_RADIUS))
+
+
+def goal_bounds(goal_pos):
+    """终点光晕可能覆盖的最大范围"""
+    x, y = to_display_coords(goal_pos)
+    radius = GOAL_GLOW_RADIUS
+    return pygame.Rect(x + TILE_SIZE // 2 - radius, y + TILE_SIZE // 2 - radius, radius * 2, radius * 2)
+
+
+class DirtyTracker:
+    """收集一帧内需要重绘的矩形, 合并重叠部分后交给 display.update"""
+
+    def __init__(self, screen_rect):
+        self.screen_rect = pygame.Rect(screen_rect)
+        self.rects = []
+        self.full = True
+
+    def add(self, rect):
+        self.rects.append(pygame.Rect(rect))
+
+    def mark_full(self):
+        self.full = True
+
+    def collect(self):
+        if self.full:
+            merged = [self.screen_rect.copy()]
+        else:
+            merged = []
+            for rect in self.rects:
+                rect = rect.clip(self.screen_rect)
+                if not rect.width or not rect.height:
+                    continue
+                # 与已有矩形重叠则合并, 合并后可能又与其他矩形重叠
+                i = 0
+                while i < len(merged):
+                    if rect.colliderect(merged[i]):
+                        rect.union_ip(merged.pop(i))
+                        i = 0
+                    else:
+                        i += 1
+                merged.append(rect)
+        self.rects = []
+        self.full = False
+        return merged
+
+
+class TextCache:
+    """渲染好的文字表面的 LRU 缓存, 键为 (字体, 文字, 颜色), 最多保留 max_size 个.
+
+    半透明背景板也按 (尺寸, 颜色) 复用, 稳定状态下每帧不再光栅化字形或分配表面.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.backdrops = {}
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        surf = self.surfaces[key] = font.render(text, True, color)
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def backdrop(self, size, color=(0, 0, 0, 200)):
+        key = (tuple(size), color)
+        surf = self.backdrops.get(key)
+        if surf is None:
+            surf = self.backdrops[key] = pygame.Surface(size, pygame.SRCALPHA)
+            surf.fill(color)
+        return surf
+
+
+class FrameProfiler:
+    """按阶段统计每帧耗时 (毫秒).
+
+    每帧先 begin(), 每个阶段结束时 lap(阶段名), 最后 end(). 关闭时这些调用
+    直接返回, 几乎没有开销. 最近 window 帧用于计算平均值和 p99, 开启期间的
+    所有帧都会记录下来, 可以用 dump() 导出成 CSV 或 JSON.
+    """
+
+    PHASES = ('events', 'update', 'maze', 'goal', 'sprites', 'fog', 'ui', 'flip')
+
+    def __init__(self, enabled=False, window=120, max_frames=100000):
+        self.enabled = enabled
+        self.recent = deque(maxlen=window)
+        self.frames = []
+        self.max_frames = max_frames
+        # 已结束的帧数, frames 满了之后仍继续计数
+        self.count = 0
+        self.current = None
+        self.last = 0.0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.recent.clear()
+        return self.enabled
+
+    def begin(self):
+        if not self.enabled:
+            return
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        if not self.enabled or self.current is None:
+            return
+        now = time.perf_counter()
+        # 脏矩形模式下同一阶段每个区域各计一次, 累加起来
+        self.current[phase] += (now - self.last) * 1000
+        self.last = now
+
+    def end(self):
+        if not self.enabled or self.current is None:
+            return
+        frame = self.current
+        frame['total'] = sum(frame.values())
+        self.recent.append(frame)
+        self.count += 1
+        if len(self.frames) < self.max_frames:
+            self.frames.append(frame)
+        self.current = None
+
+    def stats(self):
+        """{阶段: (平均值, p99)}, 基于最近 window 帧."""
+        result = {}
+        n = len(self.recent)
+        if not n:
+            return result
+        for phase in self.PHASES + ('total',):
+            values = sorted(frame[phase] for frame in self.recent)
+            result[phase] = (sum(values) / n, values[min(n - 1, int(n * 0.99))])
+        return result
+
+    def dump(self, path):
+        """把记录的每帧耗时写到 path, 扩展名为 .json 时写 JSON, 否则写 CSV."""
+        columns = self.PHASES + ('total',)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            if path.endswith('.json'):
+                json.dump([{k: round(frame[k], 4) for k in columns} for frame in self.frames], f)
+            else:
+                f.write(','.join(('frame',) + columns) + '\n')
+                for i, frame in enumerate(self.frames):
+                    f.write(','.join([str(i)] + [f"{frame[k]:.4f}" for k in columns]) + '\n')
+        return len(self.frames)
 
 
-def generate_and_setup(rows=31, cols=31, extra_passages=60):
-    maze = make_maze(rows, cols, extra_passages)
+def generate_and_setup(rows=31, cols=31, extra_passages=60, seed=None):
+    maze = make_maze(rows, cols, extra_passages, seed)
     # find an exit far from the start
     exit_cell = find_farthest(maze, (1, 1))
     er, ec = exit_cell
-    maze[er][ec] = 2
+    maze[er, ec] = 2
     
     return maze, [1, 1], (er, ec)
 
 
+def prepare_maze(rows, cols, extra_passages, enemy_count, seed=None, algorithm=None):
+    """generate_and_setup plus the enemies' spawn cells and the junction graph, ready to play.
+
+    Returns (maze, player_pos, exit_cell, spawns, seed, graph); a new seed is
+    drawn when none is given, so every maze can be saved and rebuilt.
+    """
+    if seed is None:
+        seed = random.getrandbits(63)
+    maze = make_maze(rows, cols, extra_passages, seed, algorithm)
+    # the graph is built once here and reused for the exit and for chasing
+    graph = JunctionGraph(maze)
+    exit_cell = find_farthest(maze, (1, 1), graph)
+    maze[exit_cell] = 2
+    graph.close_cell(*exit_cell)
+    player_pos = [1, 1]
+    rng = random.Random(seed)
+    spawns = [spawn_position(maze, player_pos, rng) for _ in range(enemy_count)]
+    return maze, player_pos, exit_cell, spawns, seed, graph
+
+
+# 迷宫文件: 固定长度的文件头, 后面是逐位打包的墙 (1 = 墙), 按行优先排列
+MAZE_MAGIC = b'MAZE'
+MAZE_VERSION = 2
+# magic, version, 生成算法 (MAZE_ALGORITHMS 的下标), spawn 数, rows, cols, extra_passages, exit r, exit c, seed
+MAZE_HEADER = struct.Struct('<4sBBHIIIIIQ')
+MAZE_SPAWN = struct.Struct('<II')
+
+
+def save_maze(path, maze, exit_cell, spawns=(), seed=0, extra_passages=0, algorithm=None):
+    """Write a maze as header + spawn cells + bit-packed walls."""
+    grid = as_grid(maze)
+    rows, cols = grid.shape
+    algorithm = MAZE_ALGORITHMS.index(algorithm or MAZE_ALGORITHM)
+    with open(path, 'wb') as f:
+        f.write(MAZE_HEADER.pack(MAZE_MAGIC, MAZE_VERSION, algorithm, len(spawns), rows, cols,
+                                 extra_passages, exit_cell[0], exit_cell[1], seed))
+        for r, c in spawns:
+            f.write(MAZE_SPAWN.pack(r, c))
+        f.write(np.packbits(grid == 1).tobytes())
+
+
+class MazeFile:
+    """A maze file opened through mmap.
+
+    Only the header is parsed when opening; `grid` unpacks the walls the
+    first time it is used, and is_wall() reads single bits straight from the
+    mapping, so even a 10k x 10k file opens instantly.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, algorithm, spawn_count, self.rows, self.cols, self.extra_passages,
+             er, ec, self.seed) = MAZE_HEADER.unpack_from(self.mm)
+            if magic != MAZE_MAGIC or version != MAZE_VERSION:
+                raise ValueError("bad magic or version")
+            self.algorithm = MAZE_ALGORITHMS[algorithm]
+            self.exit_cell = (er, ec)
+            offset = MAZE_HEADER.size
+            self.spawns = [MAZE_SPAWN.unpack_from(self.mm, offset + i * MAZE_SPAWN.size)
+                           for i in range(spawn_count)]
+            offset += spawn_count * MAZE_SPAWN.size
+            self.bits = np.frombuffer(self.mm, dtype=np.uint8, count=(self.rows * self.cols + 7) // 8,
+                                      offset=offset)
+        except (struct.error, ValueError, IndexError) as e:
+            # 文件头不对, 或文件被截断 (unpack_from / frombuffer 出错), 都要先关掉映射
+            self.mm.close()
+            raise ValueError(f"{path} is not a maze file (version {MAZE_VERSION})") from e
+        self._grid = None
+
+    @property
+    def grid(self):
+        if self._grid is None:
+            grid = np.unpackbits(self.bits, count=self.rows * self.cols).reshape(self.rows, self.cols)
+            grid[self.exit_cell] = 2
+            self._grid = grid
+        return self._grid
+
+    def is_wall(self, r, c):
+        i = r * self.cols + c
+        return bool(self.bits[i >> 3] >> (7 - (i & 7)) & 1)
+
+    def close(self):
+        self.bits = None
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_maze(path):
+    return MazeFile(path)
+
+
+class MazePrefetcher:
+    """Keeps `size` mazes generating in the background so "new maze" is instant.
+
+    get() hands out the oldest queued maze and queues a replacement. If that
+    maze is not finished yet, get() waits for it rather than starting over.
+    """
+
+    def __init__(self, rows, cols, extra_passages=120, enemy_count=None, size=PREFETCH_MAZES, workers=1,
+                 algorithm=None):
+        self.rows, self.cols = rows, cols
+        self.extra_passages = extra_passages
+        self.enemy_count = ENEMY_COUNT if enemy_count is None else enemy_count
+        self.algorithm = algorithm or MAZE_ALGORITHM
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.queue = deque()
+        self.fill()
+
+    def submit(self):
+        return self.executor.submit(prepare_maze, self.rows, self.cols, self.extra_passages,
+                                    self.enemy_count, None, self.algorithm)
+
+    def fill(self):
+        while len(self.queue) < self.size:
+            self.queue.append(self.submit())
+
+    def matches(self, state):
+        """Whether the queued mazes have state's size, extra passages, enemy count and algorithm."""
+        return ((self.rows, self.cols, self.extra_passages, self.enemy_count, self.algorithm)
+                == (state.rows, state.cols, state.extra_passages, state.enemy_count, state.algorithm))
+
+    def get(self):
+        future = self.queue.popleft() if self.queue else self.submit()
+        self.fill()
+        return future.result()
+
+    def close(self):
+        for future in self.queue:
+            future.cancel()
+        self.queue.clear()
+        self.executor.shutdown(wait=False)
+
+
+class SimClock:
+    """Millisecond clock that only moves when advanced, for headless runs."""
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, ms):
+        self.now += ms
+        return self.now
+
+
+# player actions understood by GameState.step
+MOVES = {'up': (-1, 0), 'down': (1, 0), 'left': (0, -1), 'right': (0, 1)}
+# mixed into the maze seed for R re-rolls, so they don't repeat the stream prepare_maze used for the first spawns
+RESPAWN_SEED_MIX = 0x5EED_2E5E
+
+
+class GameState:
+    """Game logic without a window: maze, player, enemies, steps and win/lose.
+
+    `clock` is any callable returning milliseconds. The pygame frontend uses
+    pygame.time.get_ticks; headless runs pass a SimClock and advance it
+    themselves, so the game can run faster than real time.
+    """
+
+    def __init__(self, rows=31, cols=41, extra_passages=120, enemy_count=None, clock=None, prefetcher=None,
+                 seed=None, algorithm=None):
+        self.rows, self.cols = rows, cols
+        self.extra_passages = extra_passages
+        self.enemy_count = ENEMY_COUNT if enemy_count is None else enemy_count
+        self.algorithm = algorithm or MAZE_ALGORITHM
+        self.clock = clock or pygame.time.get_ticks
+        # optional MazePrefetcher with the same size; new mazes come from its queue
+        self.prefetcher = prefetcher
+        self.move_cooldown = 150
+        self.last_move_time = 0
+        self.flow = FlowField()
+        # with at least this many enemies they share self.flow; fewer plan incrementally on their own
+        self.flow_min_enemies = 2
+        self.new_maze(seed)
+
+    def new_maze(self, seed=None):
+        # a loaded level may differ from the prefetcher's settings; its next mazes are built here instead
+        if self.prefetcher is not None and seed is None and self.prefetcher.matches(self):
+            maze = self.prefetcher.get()
+        else:
+            maze = prepare_maze(self.rows, self.cols, self.extra_passages, self.enemy_count, seed,
+                                self.algorithm)
+        self.maze, self.player_pos, self.exit_cell, self.spawns, self.seed, self.flow.graph = maze
+        # later re-rolls (R) draw from the maze's seed, so a session can be replayed
+        self.rng = random.Random(self.seed ^ RESPAWN_SEED_MIX)
+        self.reset(self.spawns)
+
+    def save_level(self, path):
+        save_maze(path, self.maze, self.exit_cell, self.spawns, self.seed, self.extra_passages, self.algorithm)
+
+    def load_level(self, path):
+        with load_maze(path) as level:
+            self.maze = level.grid
+            self.exit_cell = level.exit_cell
+            self.spawns = level.spawns
+            self.enemy_count = len(self.spawns)
+            self.seed = level.seed
+            self.extra_passages = level.extra_passages
+            self.algorithm = level.algorithm
+        self.rows, self.cols = self.maze.shape
+        # the graph is only needed once enemies share self.flow; step() builds it then
+        self.flow.graph = None
+        self.rng = random.Random(self.seed ^ RESPAWN_SEED_MIX)
+        self.reset(self.spawns)
+
+    def reset(self, spawns=None):
+        self.player_pos = [1, 1]
+        self.steps = 0
+        self.start_time = self.clock()
+        self.end_time = None
+        self.win = False
+        self.game_over = False
+        # a new maze brings its spawn cells; R re-rolls them
+        spawns = spawns or [spawn_position(self.maze, self.player_pos, self.rng)
+                            for _ in range(self.enemy_count)]
+        self.enemies = [Enemy(self.maze, tuple(self.player_pos), self.clock, pos)
+                        for pos in spawns]
+
+    def elapsed_ms(self):
+        # 计时在胜利或被抓时停止
+        end = self.clock() if self.end_time is None else self.end_time
+        return end - self.start_time
+
+    def next_update_ms(self):
+        """Clock time at which step() can next change the game without input (None if finished)."""
+        if self.win or self.game_over:
+            return None
+        return min((enemy.last_move_time + enemy.move_cooldown for enemy in self.enemies), default=None)
+
+    def step(self, action=None, seed=None):
+        """Advance the game by one tick.
+
+        action is one of MOVES (held direction), 'new', 'reset' or None;
+        seed picks the maze for 'new'. Returns the list of events that
+        happened: 'new', 'reset', 'moved', 'win', 'caught'.
+        """
+        events = []
+        if action == 'new':
+            self.new_maze(seed)
+            return ['new']
+        if action == 'reset':
+            self.reset()
+            return ['reset']
+        if self.win or self.game_over:
+            return events
+
+        now = self.clock()
+        if action in MOVES and now - self.last_move_time >= self.move_cooldown:
+            dr, dc = MOVES[action]
+            r, c = self.player_pos[0] + dr, self.player_pos[1] + dc
+            rows, cols = self.maze.shape
+            # 检查移动是否有效
+            if 0 <= r < rows and 0 <= c < cols and self.maze[r, c] != 1:
+                self.last_move_time = now
+                self.player_pos = [r, c]
+                self.steps += 1
+                events.append('moved')
+                # 检查是否到达出口
+                if self.maze[r, c] == 2:
+                    self.win = True
+                    self.end_time = now
+                    events.append('win')
+                    return events
+
+        # 敌人追踪玩家; 多个敌人共享一个距离场, 单个敌人使用自己的增量寻路
+        player = tuple(self.player_pos)
+        flow = None
+        if len(self.enemies) >= self.flow_min_enemies:
+            flow = self.flow
+            if flow.graph is None:
+                flow.graph = JunctionGraph(self.maze)
+        for enemy in self.enemies:
+            enemy.chase_player(self.maze, player, flow)
+
+        # 检查是否被追上
+        if any(player == enemy.pos for enemy in self.enemies):
+            self.game_over = True
+            self.end_time = now
+            events.append('caught')
+        return events
+
+
+def run_episode(state, policy, tick_ms=16, max_ticks=100000):
+    """Play one game headlessly as fast as possible.
+
+    state must use a SimClock; policy(state) returns the action for each tick.
+    Returns 'win', 'caught' or None if max_ticks ran out.
+    """
+    for _ in range(max_ticks):
+        state.clock.advance(tick_ms)
+        state.step(policy(state))
+        if state.win:
+            return 'win'
+        if state.game_over:
+            return 'caught'
+    return None
+
+
+# 输入记录文件: 文件头 + 一串记录, 每条记录是 varint(与上一条相差的 tick 数) + 一个动作字节;
+# 'new' 后面跟 8 字节的迷宫种子, 'end' 后面跟结局字节和 varint 步数
+INPUT_MAGIC = b'MZIN'
+INPUT_VERSION = 2
+# magic, version, tick_ms, 生成算法 (MAZE_ALGORITHMS 的下标), enemy_count, rows, cols, extra_passages, seed
+INPUT_HEADER = struct.Struct('<4sBBBxHIIIQ')
+INPUT_CODES = [None, 'up', 'down', 'left', 'right', 'reset', 'new', 'end']
+OUTCOME_CODES = [None, 'win', 'caught']
+
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+class InputLog:
+    """A recorded session: the first maze's settings and seed, plus tick-stamped inputs.
+
+    entries are (tick, action, arg) in order. action is a held direction
+    (or None when released), 'reset', 'new' (arg = seed of the new maze) or
+    'end' (arg = (outcome, steps), the result to check a replay against).
+    An input at tick k applies before the k-th GameState.step of the session.
+    """
+
+    def __init__(self, rows, cols, extra_passages, enemy_count, seed, tick_ms=LOGIC_TICK_MS,
+                 algorithm=MAZE_ALGORITHMS[0]):
+        self.rows, self.cols = rows, cols
+        self.extra_passages = extra_passages
+        self.enemy_count = enemy_count
+        self.seed = seed
+        self.tick_ms = tick_ms
+        self.algorithm = algorithm
+        self.entries = []
+
+    @classmethod
+    def for_state(cls, state, tick_ms=LOGIC_TICK_MS):
+        return cls(state.rows, state.cols, state.extra_passages, state.enemy_count, state.seed, tick_ms,
+                   state.algorithm)
+
+    def record(self, tick, action, arg=None):
+        self.entries.append((tick, action, arg))
+
+    def finish(self, tick, state):
+        outcome = 'win' if state.win else 'caught' if state.game_over else None
+        self.record(tick, 'end', (outcome, state.steps))
+
+    def save(self, path):
+        out = bytearray(INPUT_HEADER.pack(INPUT_MAGIC, INPUT_VERSION, self.tick_ms,
+                                          MAZE_ALGORITHMS.index(self.algorithm), self.enemy_count,
+                                          self.rows, self.cols, self.extra_passages, self.seed))
+        last = 0
+        for tick, action, arg in self.entries:
+            _write_varint(out, tick - last)
+            last = tick
+            out.append(INPUT_CODES.index(action))
+            if action == 'new':
+                out += struct.pack('<Q', arg)
+            elif action == 'end':
+                out.append(OUTCOME_CODES.index(arg[0]))
+                _write_varint(out, arg[1])
+        with open(path, 'wb') as f:
+            f.write(out)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, tick_ms, algorithm, enemy_count, rows, cols, extra, seed = INPUT_HEADER.unpack_from(data)
+        if magic != INPUT_MAGIC or version != INPUT_VERSION:
+            raise ValueError(f"{path} is not an input log (version {INPUT_VERSION})")
+        log = cls(rows, cols, extra, enemy_count, seed, tick_ms, MAZE_ALGORITHMS[algorithm])
+        pos, tick = INPUT_HEADER.size, 0
+        while pos < len(data):
+            delta, pos = _read_varint(data, pos)
+            tick += delta
+            action = INPUT_CODES[data[pos]]
+            pos += 1
+            arg = None
+            if action == 'new':
+                arg, = struct.unpack_from('<Q', data, pos)
+                pos += 8
+            elif action == 'end':
+                outcome = OUTCOME_CODES[data[pos]]
+                steps, pos = _read_varint(data, pos + 1)
+                arg = (outcome, steps)
+            log.record(tick, action, arg)
+        return log
+
+    def new_state(self, clock=None):
+        """A GameState in the recorded starting position, on a SimClock at 0."""
+        return GameState(self.rows, self.cols, self.extra_passages, self.enemy_count,
+                         clock=clock or SimClock(), seed=self.seed, algorithm=self.algorithm)
+
+
+class Replayer:
+    """Feeds an InputLog's inputs into a GameState, tick by tick."""
+
+    def __init__(self, log, state):
+        self.log = log
+        self.state = state
+        self.pending = deque(log.entries)
+        self.action = None
+        self.result = None
+
+    def done(self):
+        return not self.pending
+
+    def apply(self, tick):
+        """Apply every input stamped at or before tick; returns the events of 'new'/'reset'."""
+        events = []
+        while self.pending and self.pending[0][0] <= tick:
+            _, action, arg = self.pending.popleft()
+            if action in ('new', 'reset'):
+                events += self.state.step(action, arg)
+            elif action == 'end':
+                self.result = arg
+            else:
+                self.action = action
+        return events
+
+
+def replay_log(log, max_ticks=None):
+    """Replay a log headlessly at full speed.
+
+    Returns (state, ticks, matches); matches tells whether the outcome and
+    step count equal the ones recorded at the end of the log (None if the
+    log has no end record).
+    """
+    state = log.new_state()
+    replayer = Replayer(log, state)
+    end = log.entries[-1][0] if log.entries else 0
+    if max_ticks is not None:
+        end = min(end, max_ticks)
+    tick = 0
+    while True:
+        replayer.apply(tick)
+        if tick >= end:
+            break
+        state.clock.advance(log.tick_ms)
+        state.step(replayer.action)
+        tick += 1
+    matches = None
+    if replayer.result is not None:
+        outcome = 'win' if state.win else 'caught' if state.game_over else None
+        matches = replayer.result == (outcome, state.steps)
+    return state, tick, matches
+
+
 def main():
+    parser = argparse.ArgumentParser(description="追杀迷宫 - 逃生游戏")
+    parser.add_argument('level', nargs='?', help="打开保存过的关卡 (.maze)")
+    parser.add_argument('--record', metavar='PATH', help="把本局的输入记录到文件, 退出时写入")
+    parser.add_argument('--replay', metavar='PATH', help="按原速在窗口中回放输入记录")
+    parser.add_argument('--maze', choices=MAZE_ALGORITHMS, default=MAZE_ALGORITHM, help="迷宫生成算法")
+    args = parser.parse_args()
+
     pygame.init()
-    global OFFSET_Y, SHOW_TEXTURE, SHOW_FOG
-    load_wall_texture()
-    load_player_texture()
-    load_enemy_texture()
-    load_goal_texture()
+    global OFFSET_Y, SHOW_TEXTURE, SHOW_FOG, camera
+    # 图片在后台解码, 同时生成迷宫、创建窗口
+    assets.preload(WALL_TEXTURE_FILES + PLAYER_TEXTURE_FILES + ENEMY_TEXTURE_FILES + GOAL_TEXTURE_FILES)
     
-    # 初始化迷宫
-    rows, cols = 31, 41
-    maze, player_pos, exit_cell = generate_and_setup(rows, cols, extra_passages=120)
-    ROWS, COLS = len(maze), len(maze[0])
-    WIDTH, HEIGHT = COLS * TILE_SIZE, ROWS * TILE_SIZE
+    # 初始化迷宫和游戏状态; 之后的新迷宫由后台线程提前生成
+    prefetcher = None
+    if PREFETCH_MAZES and not args.replay:
+        prefetcher = MazePrefetcher(MAZE_ROWS, MAZE_COLS, extra_passages=120, algorithm=args.maze)
+    # 逻辑时钟只按固定步长前进, 与渲染帧率无关; 同样的输入总是得到同样的结果
+    logic_clock = SimClock()
+    replayer = recorder = None
+    if args.replay:
+        log = InputLog.load(args.replay)
+        state = log.new_state(logic_clock)
+        replayer = Replayer(log, state)
+    else:
+        state = GameState(MAZE_ROWS, MAZE_COLS, extra_passages=120, clock=logic_clock, prefetcher=prefetcher,
+                          algorithm=args.maze)
+        if args.level:
+            state.load_level(args.level)
+        if args.record:
+            recorder = InputLog.for_state(state)
+            if args.level:
+                # 记录里只有关卡的生成参数, 回放时要能用它们重新生成同样的迷宫和敌人位置
+                start = recorder.new_state()
+                if not (np.array_equal(start.maze, state.maze)
+                        and [tuple(p) for p in start.spawns] == [tuple(p) for p in state.spawns]):
+                    parser.error(f"{args.level} 无法由种子重新生成, 不能和 --record 一起使用")
+    ROWS, COLS = state.maze.shape
+    # 窗口大小只取决于视口, 与迷宫大小无关
+    WIDTH, HEIGHT = min(COLS, VIEW_COLS) * TILE_SIZE, min(ROWS, VIEW_ROWS) * TILE_SIZE
     OFFSET_Y = UI_BAR_HEIGHT
+    camera = Camera(WIDTH, HEIGHT)
+    camera.follow(state.player_pos, state.maze.shape)
     
     # 设置显示
     screen = pygame.display.set_mode((WIDTH, HEIGHT + UI_BAR_HEIGHT))
     pygame.display.set_caption("追杀迷宫 - 逃生游戏 🎮")
     clock = pygame.time.Clock()
+
+    # 显示模式设置好之后再加载贴图, 这样贴图能转换成屏幕的像素格式
+    load_wall_texture()
+    load_player_texture()
+    load_enemy_texture()
+    load_goal_texture()
+    maze_layer = MazeLayer(state.maze)
+    if LINE_OF_SIGHT:
+        visibility = Visibility()
+        fog = TileFog((WIDTH, HEIGHT + UI_BAR_HEIGHT))
+    else:
+        fog = FogOfWar((WIDTH, HEIGHT + UI_BAR_HEIGHT))
+    minimap = Minimap()
+    minimap_mode = MINIMAP
+    dirty = DirtyTracker(screen.get_rect())
+    last_scene_key = last_ui_key = last_pulse = None
+    last_player_cell = None
+    last_enemy_cells = []
+    anim_time = pygame.time.get_ticks()
     
-    # 优化字体设置 - 使用更合适的大小
-    try:
-        font = pygame.font.SysFont("microsoftyahei", 36)
-    except:
-        try:
-            font = pygame.font.SysFont("simsun", 36)
-        except:
-            font = pygame.font.Font(None, 36)
-    
-    try:
-        btn_font = pygame.font.SysFont("microsoftyahei", 20)
-    except:
-        try:
-            btn_font = pygame.font.SysFont("simsun", 20)
-        except:
-            btn_font = pygame.font.Font(None, 20)
-    
-    try:
-        info_font = pygame.font.SysFont("microsoftyahei", 18)
-    except:
-        try:
-            info_font = pygame.font.SysFont("simsun", 18)
-        except:
-            info_font = pygame.font.Font(None, 18)
-    
-    # 初始化游戏状态
-    steps = 0
-    win = False
-    game_over = False
-    move_cooldown = 150
-    start_time = pygame.time.get_ticks()
-    last_move_time = 0
-    
-    # 创建追踪者
-    enemy = Enemy(maze, tuple(player_pos))
+    # 字体路径只解析一次 (有磁盘缓存), 三种字号共用
+    font_path = resolve_font_path()
+    font = pygame.font.Font(font_path, 36)
+    btn_font = pygame.font.Font(font_path, 20)
+    info_font = pygame.font.Font(font_path, 18)
     
-    # UI元素
+    # UI元素, 文字表面统一走缓存
+    text_cache = TextCache()
+    profiler = FrameProfiler(PROFILE)
+    profile_lines = []
     hint_text = ""
     hint_until = 0
     new_btn_rect = pygame.Rect(10, 8, 100, 34)
     reset_btn_rect = pygame.Rect(120, 8, 100, 34)
 
     print("游戏启动!使用方向键移动逃离追踪者,N键生成新迷宫,R键重置")
+    first_frame = True
+    # tick 是已经执行的逻辑步数, lag 是还没消化的真实时间
+    tick = 0
+    lag = 0
+    last_real = pygame.time.get_ticks()
+    pending = []
+    recorded_action = None
+
+    def logic_to_real(t):
+        # 逻辑时间 t 之后第一个逻辑步实际会在什么时候执行
+        ticks = max(1, math.ceil((t - logic_clock.now) / LOGIC_TICK_MS))
+        return last_real + ticks * LOGIC_TICK_MS - lag
 
     while True:
         current_time = pygame.time.get_ticks()
+        profiler.begin()
         
         # 处理事件
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                if recorder is not None:
+                    recorder.finish(tick, state)
+                    recorder.save(args.record)
+                    print(f"[debug] Recorded {len(recorder.entries)} inputs to {args.record}")
+                if prefetcher is not None:
+                    prefetcher.close()
                 pygame.quit()
                 sys.exit()
                 
@@ -404,172 +2175,314 @@ def main():
                 
                 if event.key == pygame.K_n:
                     print("生成新迷宫...")
-                    maze, player_pos, exit_cell = generate_and_setup(rows, cols, extra_passages=120)
-                    ROWS, COLS = len(maze), len(maze[0])
-                    steps = 0
-                    start_time = current_time
-                    win = False
-                    game_over = False
-                    enemy = Enemy(maze, tuple(player_pos))
+                    pending.append('new')
                     hint_text = "新的迷宫!"
                     hint_until = current_time + 2000
                     
                 elif event.key == pygame.K_r:
                     print("重置玩家位置...")
-                    player_pos = [1, 1]
-                    steps = 0
-                    start_time = current_time
-                    win = False
-                    game_over = False
-                    enemy = Enemy(maze, tuple(player_pos))
+                    pending.append('reset')
                     hint_text = "重新开始!"
                     hint_until = current_time + 2000
+
+                elif event.key == pygame.K_F5:
+                    level_path = f"level_{state.seed}.maze"
+                    state.save_level(level_path)
+                    print(f"[debug] Saved maze to {level_path}")
+                    hint_text = "已保存关卡!"
+                    hint_until = current_time + 2000
+
+                elif event.key == pygame.K_F3:
+                    profiler.toggle()
+                    profile_lines = []
+                    dirty.mark_full()
+
+                elif event.key == pygame.K_m:
+                    minimap_mode = MINIMAP_MODES[(MINIMAP_MODES.index(minimap_mode) + 1) % len(MINIMAP_MODES)]
+                    dirty.mark_full()
+
+                elif event.key == pygame.K_F4:
+                    count = profiler.dump(PROFILE_DUMP_PATH)
+                    print(f"[debug] Wrote {count} frame timings to {PROFILE_DUMP_PATH}")
                     
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mx, my = event.pos
                 if new_btn_rect.collidepoint((mx, my)):
-                    maze, player_pos, exit_cell = generate_and_setup(rows, cols, extra_passages=120)
-                    ROWS, COLS = len(maze), len(maze[0])
-                    steps = 0
-                    start_time = current_time
-                    win = False
-                    game_over = False
-                    enemy = Enemy(maze, tuple(player_pos))
+                    pending.append('new')
                     hint_text = "新迷宫!"
                     hint_until = current_time + 2000
                 elif reset_btn_rect.collidepoint((mx, my)):
-                    player_pos = [1, 1]
-                    steps = 0
-                    start_time = current_time
-                    win = False
-                    game_over = False
-                    enemy = Enemy(maze, tuple(player_pos))
+                    pending.append('reset')
                     hint_text = "重置!"
                     hint_until = current_time + 2000
+
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                dirty.mark_full()
         
+        profiler.lap('events')
+
         # 处理连续按键移动
-        if not win and not game_over:
-            keys = pygame.key.get_pressed()
-            
-            if current_time - last_move_time >= move_cooldown:
-                new_pos = player_pos.copy()
-                moved = False
-                
-                if keys[pygame.K_UP]: 
-                    new_pos[0] -= 1
-                    moved = True
-                elif keys[pygame.K_DOWN]: 
-                    new_pos[0] += 1
-                    moved = True
-                elif keys[pygame.K_LEFT]: 
-                    new_pos[1] -= 1
-                    moved = True
-                elif keys[pygame.K_RIGHT]: 
-                    new_pos[1] += 1
-                    moved = True
-                
-                # 检查移动是否有效
-                if moved:
-                    if 0 <= new_pos[0] < ROWS and 0 <= new_pos[1] < COLS and maze[new_pos[0]][new_pos[1]] != 1:
-                        last_move_time = current_time
-                        player_pos = new_pos
-                        steps += 1
-                        
-                        # 检查是否到达出口
-                        if maze[player_pos[0]][player_pos[1]] == 2:
-                            win = True
-                            hint_text = "恭喜通关!"
-                            hint_until = current_time + 5000
-        
-            # 敌人追踪玩家
-            enemy.chase_player(maze, tuple(player_pos))
-            
-            # 检查是否被追上
-            if tuple(player_pos) == enemy.pos:
-                game_over = True
-                hint_text = "被追上了!游戏结束!"
-                hint_until = current_time + 5000
-        
-        # 绘制场景 - 先绘制迷宫
-        screen.fill((20, 20, 20))
-        
-        # 绘制迷宫
-        draw_maze(screen, maze)
-        
-        # 绘制出口 - 使用draw_goal函数，传入时间实现闪烁效果
-        draw_goal(screen, exit_cell, current_time)
-        
-        # 绘制敌人
-        enemy.draw(screen)
-        
-        # 绘制玩家
-        draw_player(screen, player_pos)
-        
-        # 绘制迷雾效果 (在UI之前绘制,使UI可见)
-        if SHOW_FOG and not win and not game_over:
-            fog = pygame.Surface((WIDTH, HEIGHT + UI_BAR_HEIGHT), pygame.SRCALPHA)
-            fog.fill((0, 0, 0, 180))
-            px, py = to_display_coords(tuple(player_pos))
-            pygame.draw.circle(fog, (0, 0, 0, 0), (px + TILE_SIZE // 2, py + TILE_SIZE // 2), VISION_RADIUS)
-            screen.blit(fog, (0, 0))
-        
-        # 绘制UI栏 (在迷雾之后,确保可见)
-        pygame.draw.rect(screen, (50, 50, 50), (0, 0, WIDTH, UI_BAR_HEIGHT))
-        
-        # 绘制UI按钮 - 优化按钮大小和文字
-        pygame.draw.rect(screen, (200, 200, 200), new_btn_rect)
-        pygame.draw.rect(screen, (200, 200, 200), reset_btn_rect)
-        pygame.draw.rect(screen, (100, 100, 100), new_btn_rect, 2)  # 添加边框
-        pygame.draw.rect(screen, (100, 100, 100), reset_btn_rect, 2)
-        
-        new_text = btn_font.render("新迷宫(N)", True, (0, 0, 0))
-        reset_text = btn_font.render("重置(R)", True, (0, 0, 0))
-        # 居中显示按钮文字
-        screen.blit(new_text, (new_btn_rect.x + (new_btn_rect.width - new_text.get_width()) // 2, 
-                               new_btn_rect.y + (new_btn_rect.height - new_text.get_height()) // 2))
-        screen.blit(reset_text, (reset_btn_rect.x + (reset_btn_rect.width - reset_text.get_width()) // 2, 
-                                 reset_btn_rect.y + (reset_btn_rect.height - reset_text.get_height()) // 2))
+        keys = pygame.key.get_pressed()
+        action = None
+        if keys[pygame.K_UP]:
+            action = 'up'
+        elif keys[pygame.K_DOWN]:
+            action = 'down'
+        elif keys[pygame.K_LEFT]:
+            action = 'left'
+        elif keys[pygame.K_RIGHT]:
+            action = 'right'
+        events = []
+        if replayer is not None:
+            # 回放时操作全部来自记录
+            pending.clear()
+        for act in pending:
+            events += state.step(act)
+            if recorder is not None:
+                recorder.record(tick, act, state.seed if act == 'new' else None)
+        pending.clear()
+
+        # 游戏逻辑按固定步长推进, 一帧可能走 0 步或多步
+        lag += current_time - last_real
+        last_real = current_time
+        steps = 0
+        while lag >= LOGIC_TICK_MS:
+            if replayer is not None:
+                events += replayer.apply(tick)
+                if replayer.done():
+                    break
+                action = replayer.action
+            elif recorder is not None and action != recorded_action:
+                recorder.record(tick, action)
+                recorded_action = action
+            lag -= LOGIC_TICK_MS
+            logic_clock.advance(LOGIC_TICK_MS)
+            events += state.step(action)
+            tick += 1
+            steps += 1
+            if steps == MAX_LOGIC_STEPS:
+                # 落后太多 (例如窗口被拖动过) 时丢掉积压, 不再追赶
+                lag = 0
+                break
+        if replayer is not None and replayer.done():
+            outcome = 'win' if state.win else 'caught' if state.game_over else None
+            print(f"[debug] Replay finished at tick {tick}: {outcome}, {state.steps} steps, "
+                  f"recorded {replayer.result}")
+            replayer = None
+        if maze_layer.grid is not state.maze:
+            maze_layer.rebuild(state.maze)
+        if 'win' in events:
+            hint_text = "恭喜通关!"
+            hint_until = current_time + 5000
+        elif 'caught' in events:
+            hint_text = "被追上了!游戏结束!"
+            hint_until = current_time + 5000
         
-        # 绘制计时器和步数 - 使用更小的字体
-        elapsed_s = (current_time - start_time) // 1000
-        info = f"时间: {elapsed_s}s  步数: {steps}"
-        info_surf = info_font.render(info, True, (255, 255, 255))
-        screen.blit(info_surf, (WIDTH - info_surf.get_width() - 10, 20))
+        # 渲染只读取游戏状态
+        maze, player_pos, exit_cell = state.maze, state.player_pos, state.exit_cell
+        enemies, win, game_over = state.enemies, state.win, state.game_over
+        camera.follow(player_pos, maze.shape)
+        # 游戏结束后动画停住, 画面不再变化
+        if not win and not game_over:
+            anim_time = current_time
+        profiler.lap('update')
         
-        # 绘制提示文本 - 优化位置
+        # 本帧用到的文字 (大多来自缓存), 脏矩形模式下每个区域重绘时复用
+        new_text = text_cache.render(btn_font, "新迷宫(N)", (0, 0, 0))
+        reset_text = text_cache.render(btn_font, "重置(R)", (0, 0, 0))
+        elapsed_s = state.elapsed_ms() // 1000
+        info = f"时间: {elapsed_s}s  步数: {state.steps}"
+        info_surf = text_cache.render(info_font, info, (255, 255, 255))
+        hint_surf = None
         if hint_text and current_time < hint_until:
-            hint_surf = btn_font.render(hint_text, True, (255, 255, 100))
-            screen.blit(hint_surf, (WIDTH // 2 - hint_surf.get_width() // 2, 20))
-        
-        # 绘制胜利或失败文本 - 优化大小和背景
-        if win:
-            win_text = font.render("成功逃脱!", True, (255, 255, 0))
-            text_rect = win_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + OFFSET_Y))
-            # 绘制半透明背景
-            bg_rect = pygame.Rect(text_rect.x - 20, text_rect.y - 15, text_rect.width + 40, text_rect.height + 30)
-            bg_surf = pygame.Surface((bg_rect.width, bg_rect.height), pygame.SRCALPHA)
-            bg_surf.fill((0, 0, 0, 200))
-            screen.blit(bg_surf, bg_rect)
-            screen.blit(win_text, text_rect)
-            # 添加表情符号
-            emoji_text = font.render("🎉", True, (255, 255, 255))
-            screen.blit(emoji_text, (text_rect.x - 40, text_rect.y))
-            screen.blit(emoji_text, (text_rect.x + text_rect.width + 10, text_rect.y))
-        elif game_over:
-            lose_text = font.render("被追上了!", True, (255, 0, 0))
-            text_rect = lose_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + OFFSET_Y))
-            # 绘制半透明背景
-            bg_rect = pygame.Rect(text_rect.x - 20, text_rect.y - 15, text_rect.width + 40, text_rect.height + 30)
-            bg_surf = pygame.Surface((bg_rect.width, bg_rect.height), pygame.SRCALPHA)
-            bg_surf.fill((0, 0, 0, 200))
-            screen.blit(bg_surf, bg_rect)
-            screen.blit(lose_text, text_rect)
-            # 添加表情符号
-            emoji_text = font.render("💀", True, (255, 255, 255))
-            screen.blit(emoji_text, (text_rect.x - 40, text_rect.y))
-            screen.blit(emoji_text, (text_rect.x + text_rect.width + 10, text_rect.y))
-
-        pygame.display.flip()
+            hint_surf = text_cache.render(btn_font, hint_text, (255, 255, 100))
+        # 准备工作按用途记到各自的阶段里, 绘制阶段只统计真正的绘制
+        profiler.lap('ui')
+        show_fog = SHOW_FOG and not win and not game_over
+        if show_fog:
+            if LINE_OF_SIGHT:
+                fog_changed = fog.update(visibility.visible(maze, player_pos))
+            else:
+                px, py = to_display_coords(tuple(player_pos))
+                fog_changed = fog.update((px + TILE_SIZE // 2, py + TILE_SIZE // 2))
+        profiler.lap('fog')
+        # 耗时面板每 30 帧刷新一次文字, 其余帧复用缓存的表面
+        if profiler.enabled and (not profile_lines or profiler.count % 30 == 0):
+            profile_lines = [text_cache.render(info_font, f"{phase:<8}{avg:6.2f} ms  p99 {p99:6.2f}", (0, 255, 0))
+                             for phase, (avg, p99) in profiler.stats().items()]
+        profile_rect = None
+        if profiler.enabled and profile_lines:
+            # 放在右上角, 避开玩家的出生点
+            profile_rect = pygame.Rect(0, UI_BAR_HEIGHT + 5, max(line.get_width() for line in profile_lines) + 10,
+                                       sum(line.get_height() for line in profile_lines) + 10)
+            profile_rect.right = WIDTH - 5
+        minimap_rect = None
+        if minimap_mode != 'off':
+            # 小地图放在迷宫区域右下角, 全图模式居中并尽量占满迷宫区域
+            if minimap_mode == 'overview':
+                minimap.resize((WIDTH - 20, HEIGHT - 20))
+            else:
+                minimap.resize((MINIMAP_SIZE, MINIMAP_SIZE))
+            minimap_changed = minimap.update(maze, player_pos, enemies, exit_cell)
+            if minimap_mode == 'overview':
+                minimap_rect = minimap.get_rect(center=(WIDTH // 2, HEIGHT // 2 + OFFSET_Y))
+            else:
+                minimap_rect = minimap.get_rect(bottomright=(WIDTH - 8, HEIGHT + OFFSET_Y - 8))
+        profiler.lap('ui')
+
+        # 只在画面有变化时重绘: 新迷宫、重置、胜负变化或摄像机移动时整屏重绘;
+        # 角色移动、界面文字变化时, 脏矩形模式只重绘变化的区域, 否则整屏重绘
+        scene_key = (id(maze), id(enemies), win, game_over, camera.x, camera.y)
+        if scene_key != last_scene_key:
+            dirty.mark_full()
+            last_scene_key = scene_key
+        cells = [tuple(player_pos)] + [enemy.pos for enemy in enemies]
+        ui_key = (info, hint_surf is not None and hint_text)
+        if DIRTY_RECTS:
+            for cell, last_cell in zip(cells, [last_player_cell] + last_enemy_cells):
+                if cell != last_cell:
+                    dirty.add((*to_display_coords(cell), TILE_SIZE, TILE_SIZE))
+                    if last_cell is not None:
+                        dirty.add((*to_display_coords(last_cell), TILE_SIZE, TILE_SIZE))
+            if show_fog:
+                for rect in fog_changed:
+                    dirty.add(rect)
+            if ui_key != last_ui_key:
+                dirty.add((0, 0, WIDTH, UI_BAR_HEIGHT))
+        elif cells != [last_player_cell] + last_enemy_cells or ui_key != last_ui_key:
+            dirty.mark_full()
+        last_player_cell, last_enemy_cells = cells[0], cells[1:]
+        last_ui_key = ui_key
+        # 终点闪烁换帧时只重绘终点周围
+        pulse = goal_frame_index(anim_time)
+        if pulse != last_pulse:
+            dirty.add(goal_bounds(exit_cell))
+            last_pulse = pulse
+        if profile_rect is not None:
+            dirty.add(profile_rect)
+        if minimap_rect is not None and minimap_changed:
+            dirty.add(minimap_rect)
+        clips = dirty.collect()
+        # 决定重绘哪些区域和最后的提交一起算作 flip
+        profiler.lap('flip')
+
+        for clip in clips:
+            screen.set_clip(clip)
+
+            # 绘制场景 - 先绘制迷宫
+            screen.fill((20, 20, 20))
+
+            # 绘制迷宫 (预渲染的背景层)
+            maze_layer.draw(screen)
+            profiler.lap('maze')
+
+            # 绘制出口 - 使用draw_goal函数，传入时间实现闪烁效果
+            draw_goal(screen, exit_cell, anim_time)
+            profiler.lap('goal')
+
+            # 绘制敌人
+            for enemy in enemies:
+                enemy.draw(screen)
+
+            # 绘制玩家
+            draw_player(screen, player_pos)
+            profiler.lap('sprites')
+
+            # 绘制迷雾效果 (在UI之前绘制,使UI可见)
+            if show_fog:
+                fog.draw(screen)
+            profiler.lap('fog')
+
+            # 缩略图 (M), 带一圈半透明边框
+            if minimap_rect is not None:
+                frame = minimap_rect.inflate(6, 6)
+                screen.blit(text_cache.backdrop(frame.size), frame)
+                minimap.draw(screen, minimap_rect)
+
+            # 绘制UI栏 (在迷雾之后,确保可见)
+            pygame.draw.rect(screen, (50, 50, 50), (0, 0, WIDTH, UI_BAR_HEIGHT))
+
+            # 绘制UI按钮 - 优化按钮大小和文字
+            pygame.draw.rect(screen, (200, 200, 200), new_btn_rect)
+            pygame.draw.rect(screen, (200, 200, 200), reset_btn_rect)
+            pygame.draw.rect(screen, (100, 100, 100), new_btn_rect, 2)  # 添加边框
+            pygame.draw.rect(screen, (100, 100, 100), reset_btn_rect, 2)
+
+            # 居中显示按钮文字
+            screen.blit(new_text, (new_btn_rect.x + (new_btn_rect.width - new_text.get_width()) // 2, 
+                                   new_btn_rect.y + (new_btn_rect.height - new_text.get_height()) // 2))
+            screen.blit(reset_text, (reset_btn_rect.x + (reset_btn_rect.width - reset_text.get_width()) // 2, 
+                                     reset_btn_rect.y + (reset_btn_rect.height - reset_text.get_height()) // 2))
+
+            # 绘制计时器和步数 - 使用更小的字体
+            screen.blit(info_surf, (WIDTH - info_surf.get_width() - 10, 20))
+
+            # 绘制提示文本 - 优化位置
+            if hint_surf:
+                screen.blit(hint_surf, (WIDTH // 2 - hint_surf.get_width() // 2, 20))
+
+            # 绘制胜利或失败文本 - 优化大小和背景
+            if win:
+                win_text = text_cache.render(font, "成功逃脱!", (255, 255, 0))
+                text_rect = win_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + OFFSET_Y))
+                # 绘制半透明背景
+                bg_rect = pygame.Rect(text_rect.x - 20, text_rect.y - 15, text_rect.width + 40, text_rect.height + 30)
+                screen.blit(text_cache.backdrop(bg_rect.size), bg_rect)
+                screen.blit(win_text, text_rect)
+                # 添加表情符号
+                emoji_text = text_cache.render(font, "🎉", (255, 255, 255))
+                screen.blit(emoji_text, (text_rect.x - 40, text_rect.y))
+                screen.blit(emoji_text, (text_rect.x + text_rect.width + 10, text_rect.y))
+            elif game_over:
+                lose_text = text_cache.render(font, "被追上了!", (255, 0, 0))
+                text_rect = lose_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + OFFSET_Y))
+                # 绘制半透明背景
+                bg_rect = pygame.Rect(text_rect.x - 20, text_rect.y - 15, text_rect.width + 40, text_rect.height + 30)
+                screen.blit(text_cache.backdrop(bg_rect.size), bg_rect)
+                screen.blit(lose_text, text_rect)
+                # 添加表情符号
+                emoji_text = text_cache.render(font, "💀", (255, 255, 255))
+                screen.blit(emoji_text, (text_rect.x - 40, text_rect.y))
+                screen.blit(emoji_text, (text_rect.x + text_rect.width + 10, text_rect.y))
+
+            # 耗时面板 (F3)
+            if profile_rect is not None:
+                screen.blit(text_cache.backdrop(profile_rect.size), profile_rect)
+                y = profile_rect.y + 5
+                for line in profile_lines:
+                    screen.blit(line, (profile_rect.x + 5, y))
+                    y += line.get_height()
+            profiler.lap('ui')
+
+        screen.set_clip(None)
+        if clips == [screen.get_rect()]:
+            pygame.display.flip()
+        elif clips:
+            pygame.display.update(clips)
+        profiler.lap('flip')
+        profiler.end()
+        if first_frame:
+            first_frame = False
+            print(f"[debug] Time to first frame: {(time.perf_counter() - STARTUP_T0) * 1000:.0f} ms")
+
+        # 没有按键时睡到下一件会改变画面的事: 敌人走一步、计时跳秒、终点闪烁换帧、提示消失;
+        # 游戏结束且没有提示时一直睡到有输入为止
+        if action is None and replayer is None and not profiler.enabled:
+            now = pygame.time.get_ticks()
+            deadlines = []
+            due = state.next_update_ms()
+            if due is not None:
+                deadlines.append(logic_to_real(due))
+            if not win and not game_over:
+                deadlines.append(logic_to_real(state.start_time + (elapsed_s + 1) * 1000))
+                deadlines.append(goal_next_frame_time(anim_time))
+            if hint_text and now < hint_until:
+                deadlines.append(hint_until)
+            timeout = min(deadlines) - now if deadlines else 0
+            if not deadlines or timeout > 0:
+                event = pygame.event.wait(timeout)
+                if event.type != pygame.NOEVENT:
+                    pygame.event.post(event)
         clock.tick(60)
 
 
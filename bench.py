@@ -0,0 +1,233 @@
+"""Benchmarks for the game's hot paths (generation, pathfinding, rendering).
+
+    python bench.py                               # default sizes, JSON to stdout
+    python bench.py --sizes 31x41 201x201 -o bench.json
+    python bench.py --compare bench.json          # fail if anything got slower
+
+Every size uses a fixed seed, so runs are comparable. Rendering runs under the
+dummy SDL video driver and needs no window.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+import pygame
+
+import bbb
+
+
+DEFAULT_SIZES = ["31x41", "101x101", "501x501", "1001x1001", "2001x2001"]
+SCREEN_SIZE = (1280, 720)
+
+
+def parse_size(text):
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+
+def measure(fn, repeat):
+    """Call fn() `repeat` times and return timing stats in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": min(times),
+        "mean_ms": sum(times) / len(times),
+        "max_ms": max(times),
+    }
+
+
+def open_cells(maze, count, rng):
+    r, c = np.nonzero(bbb.as_grid(maze) == 0)
+    idx = rng.choice(len(r), size=min(count, len(r)), replace=False)
+    return [(int(r[i]), int(c[i])) for i in idx]
+
+
+def bench_size(rows, cols, seed, repeat, screen):
+    results = {}
+
+    def run(name, fn, n=repeat):
+        results[name] = measure(fn, n)
+        print(f"  {name:<22} {results[name]['mean_ms']:10.2f} ms", file=sys.stderr)
+
+    def seeded(fn):
+        def wrapper():
+            random.seed(seed)
+            return fn()
+        return wrapper
+
+    run("make_maze", seeded(lambda: bbb.make_maze(rows, cols, extra_passages=rows)))
+    run("make_maze_eller", lambda: bbb.make_maze(rows, cols, extra_passages=rows, seed=seed, algorithm="eller"))
+    run("generate_and_setup", seeded(lambda: bbb.generate_and_setup(rows, cols, extra_passages=rows)))
+    random.seed(seed)
+    maze, player_pos, exit_cell = bbb.generate_and_setup(rows, cols, extra_passages=rows)
+    run("find_farthest", lambda: bbb.find_farthest(maze, (1, 1)))
+
+    # chasing: one cold plan, then warm ticks while the player random-walks
+    rng = np.random.default_rng(seed)
+    player, spawn = open_cells(maze, 2, rng)
+
+    def new_enemy():
+        clock = bbb.SimClock()
+        random.seed(seed)
+        enemy = bbb.Enemy(maze, player, clock)
+        enemy.pos = spawn
+        return enemy, clock
+
+    def chase_cold():
+        enemy, clock = new_enemy()
+        clock.advance(enemy.move_cooldown)
+        enemy.chase_player(maze, player)
+
+    walk_rng = random.Random(seed)
+    walk = [player]
+    grid = bbb.as_grid(maze)
+    for _ in range(200):
+        r, c = walk[-1]
+        nbrs = [(r + dr, c + dc) for dr, dc in bbb.MOVES.values() if grid[r + dr, c + dc] == 0]
+        walk.append(walk_rng.choice(nbrs) if nbrs else (r, c))
+
+    def chase_warm():
+        enemy, clock = new_enemy()
+        for target in walk:
+            clock.advance(enemy.move_cooldown)
+            enemy.chase_player(maze, target)
+
+    def flow_warm(flow=None):
+        flow = flow or bbb.FlowField()
+        for target in walk[::10]:
+            flow.update(maze, target)
+            flow.next_step(spawn)
+
+    graph = bbb.JunctionGraph(maze)
+
+    def flow_graph_warm():
+        flow_warm(bbb.FlowField(graph))
+
+    run("chase_player_cold", chase_cold)
+    run("chase_player_200_ticks", chase_warm, max(1, repeat // 2))
+    run("flow_field_20_updates", flow_warm, max(1, repeat // 2))
+    run("junction_graph_build", lambda: bbb.JunctionGraph(maze), max(1, repeat // 2))
+    run("flow_graph_20_updates", flow_graph_warm, max(1, repeat // 2))
+    if len(graph.adj) <= bbb.GRAPH_TABLE_MAX_NODES:
+        run("graph_table_build", graph.build_table, max(1, repeat // 2))
+        run("flow_table_20_updates", flow_graph_warm, max(1, repeat // 2))
+
+    # rendering onto a fixed-size screen; tiles outside it are clipped
+    run("draw_maze", lambda: bbb.draw_maze(screen, maze, offset_y=0), max(1, repeat // 2))
+    layer = bbb.MazeLayer(maze)
+    layer.draw(screen)  # render the visible chunks once
+    run("maze_layer_blit", lambda: layer.draw(screen))
+    ticks = iter(range(0, 10 ** 9, 16))
+    run("draw_goal", lambda: bbb.draw_goal(screen, (3, 3), next(ticks)), repeat * 10)
+    fog = bbb.FogOfWar(screen.get_size())
+    centers = iter([(100 + i % 400, 100 + i % 300) for i in range(repeat * 10)])
+
+    def fog_pass():
+        fog.update(next(centers))
+        fog.draw(screen)
+
+    run("fog_pass", fog_pass, repeat * 10)
+
+    # line of sight: cold shadowcasting for 50 cells, then the tile fog for each
+    sight_cells = open_cells(maze, 50, np.random.default_rng(seed))
+    run("visibility_50_cells", lambda: [bbb.Visibility().visible(maze, cell) for cell in sight_cells])
+    visibility = bbb.Visibility()
+    tile_fog = bbb.TileFog(screen.get_size())
+    sights = iter([visibility.visible(maze, sight_cells[i % 50]) for i in range(repeat * 10)])
+
+    def tile_fog_pass():
+        tile_fog.update(next(sights))
+        tile_fog.draw(screen)
+
+    run("tile_fog_pass", tile_fog_pass, repeat * 10)
+
+    # minimap: one surfarray build per maze, then marker-only refreshes
+    run("minimap_build", lambda: bbb.Minimap().update(maze, player, [], spawn), max(1, repeat // 2))
+    minimap = bbb.Minimap()
+    minimap.update(maze, player, [], spawn)
+    steps = iter(walk * (repeat * 10 // len(walk) + 1))
+    run("minimap_marker_update", lambda: minimap.update(maze, next(steps), [], spawn), repeat * 10)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return (size, name, old, new) for every benchmark slower than threshold x baseline."""
+    slower = []
+    for size, benches in results.items():
+        for name, stats in benches.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if old and stats["mean_ms"] > old["mean_ms"] * threshold:
+                slower.append((size, name, old["mean_ms"], stats["mean_ms"]))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the maze game's hot paths.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="maze sizes as ROWSxCOLS")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown factor that counts as a regression (default 1.25)")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    bbb.load_wall_texture()
+    bbb.load_player_texture()
+    bbb.load_enemy_texture()
+    bbb.load_goal_texture()
+    screen = pygame.Surface(SCREEN_SIZE)
+
+    results = {}
+    for size in args.sizes:
+        rows, cols = parse_size(size)
+        print(f"{rows}x{cols}:", file=sys.stderr)
+        results[f"{rows}x{cols}"] = bench_size(rows, cols, args.seed, args.repeat, screen)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "screen": list(SCREEN_SIZE),
+            "tile_size": bbb.TILE_SIZE,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.threshold)
+        for size, name, old, new in slower:
+            print(f"REGRESSION {size} {name}: {old:.2f} ms -> {new:.2f} ms", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Scripted players for load-testing maze_server.py.
+
+    python maze_server.py &
+    python maze_bots.py -n 1000 --duration 30
+
+Each bot opens its own connection, mirrors its session from the server's
+messages and always steps along a shortest path to the exit. When a game
+ends it asks for a new maze and plays again. Throughput and outcomes are
+printed to stderr; the exit code is 1 if any bot never received a maze.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import asyncio
+import sys
+import time
+
+import bbb
+import maze_server
+
+
+class Totals:
+    def __init__(self):
+        self.connected = self.playing = self.failed = 0
+        self.messages = self.bytes = 0
+        self.outcomes = {"win": 0, "caught": 0}
+
+
+def next_action(view, flow):
+    """Direction of the next cell on a shortest path to the exit."""
+    r, c = flow.next_step(view.player)
+    for action, (dr, dc) in bbb.MOVES.items():
+        if (view.player[0] + dr, view.player[1] + dc) == (r, c):
+            return action
+    return None
+
+
+async def bot(index, args, totals, stop_at):
+    await asyncio.sleep(index * args.ramp / max(1, args.count))
+    try:
+        if args.unix:
+            reader, writer = await asyncio.open_unix_connection(args.unix)
+        else:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+    except OSError:
+        totals.failed += 1
+        return
+    totals.connected += 1
+    view = maze_server.SessionView()
+    flow = bbb.FlowField()
+    maze = held = None
+    outcome = None
+    asked_new = False
+    try:
+        while time.monotonic() < stop_at:
+            header = await reader.readexactly(maze_server.FRAME.size)
+            (length,) = maze_server.FRAME.unpack(header)
+            body = await reader.readexactly(length)
+            totals.messages += 1
+            totals.bytes += length + len(header)
+            if view.apply(body) == maze_server.MSG_MAZE:
+                if maze is None:
+                    totals.playing += 1
+                asked_new = False
+            if view.maze is None or view.player is None or asked_new:
+                continue
+            if view.outcome is not None:
+                if outcome is None:
+                    totals.outcomes[view.outcome] += 1
+                writer.write(maze_server.encode_input("new"))
+                asked_new = True
+            else:
+                if view.maze is not maze:
+                    maze = view.maze
+                    flow.update(maze, view.exit_cell)
+                action = next_action(view, flow)
+                if action != held:
+                    writer.write(maze_server.encode_input(action))
+                    held = action
+            outcome = view.outcome
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def report(totals, every, stop_at):
+    last = (0, 0)
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(every)
+        messages, size = totals.messages - last[0], totals.bytes - last[1]
+        last = (totals.messages, totals.bytes)
+        print(f"{totals.connected} connected, {totals.playing} playing, "
+              f"{totals.outcomes['win']} wins, {totals.outcomes['caught']} caught, "
+              f"{messages / every:.0f} msg/s, {size / every / 1024:.1f} KiB/s, "
+              f"{size / max(1, messages):.1f} bytes/msg", file=sys.stderr)
+
+
+async def run(args):
+    totals = Totals()
+    stop_at = time.monotonic() + args.ramp + args.duration
+    reporter = asyncio.create_task(report(totals, args.report, stop_at))
+    await asyncio.gather(*(bot(i, args, totals, stop_at) for i in range(args.count)))
+    reporter.cancel()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Connect many scripted players to maze_server.py.")
+    parser.add_argument("-n", "--count", type=int, default=100, help="number of bots")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to play after the last bot connects")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which the bots connect")
+    parser.add_argument("--report", type=float, default=5.0, help="seconds between stats lines")
+    args = parser.parse_args(argv)
+
+    maze_server.raise_fd_limit()
+    totals = asyncio.run(run(args))
+    missing = args.count - totals.playing
+    print(f"{totals.playing}/{args.count} bots played, {totals.failed} failed to connect, "
+          f"{totals.outcomes['win']} wins, {totals.outcomes['caught']} caught", file=sys.stderr)
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Thin pygame client for maze_server.py.
+
+    python maze_server.py &
+    python maze_client.py                       # or --host/--port, or --unix PATH
+
+All game logic runs on the server. The client only sends key changes and
+draws its session from the server's messages with bbb's renderers.
+Arrow keys move, N asks for a new maze, R resets.
+"""
+import argparse
+import socket
+import sys
+
+import pygame
+
+import bbb
+import maze_server
+
+KEY_ACTIONS = [(pygame.K_UP, "up"), (pygame.K_DOWN, "down"), (pygame.K_LEFT, "left"), (pygame.K_RIGHT, "right")]
+
+
+def connect(args):
+    if args.unix:
+        sock = socket.socket(socket.AF_UNIX)
+        sock.connect(args.unix)
+    else:
+        sock = socket.create_connection((args.host, args.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setblocking(False)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a session on a maze_server.py server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    args = parser.parse_args(argv)
+
+    sock = connect(args)
+    frames = maze_server.FrameBuffer()
+    view = maze_server.SessionView()
+
+    pygame.init()
+    width, height = bbb.VIEW_COLS * bbb.TILE_SIZE, bbb.VIEW_ROWS * bbb.TILE_SIZE
+    screen = pygame.display.set_mode((width, height + bbb.UI_BAR_HEIGHT))
+    pygame.display.set_caption("追杀迷宫 - 联机")
+    # bbb's renderers read these module globals
+    bbb.OFFSET_Y = bbb.UI_BAR_HEIGHT
+    bbb.camera = bbb.Camera(width, height)
+    bbb.load_wall_texture()
+    bbb.load_player_texture()
+    bbb.load_enemy_texture()
+    bbb.load_goal_texture()
+    font = pygame.font.Font(bbb.resolve_font_path(), 18)
+    text_cache = bbb.TextCache()
+    layer = bbb.MazeLayer()
+    clock = pygame.time.Clock()
+    held = None
+
+    while True:
+        commands = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                sock.close()
+                pygame.quit()
+                return 0
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_n:
+                commands.append("new")
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                commands.append("reset")
+        keys = pygame.key.get_pressed()
+        action = next((name for key, name in KEY_ACTIONS if keys[key]), None)
+        # only changes go over the wire; the server holds the direction meanwhile
+        if action != held:
+            commands.append(action)
+            held = action
+        if commands:
+            sock.sendall(b"".join(maze_server.encode_input(command) for command in commands))
+
+        try:
+            data = sock.recv(65536)
+        except BlockingIOError:
+            data = None
+        if data == b"":
+            print("Server closed the connection", file=sys.stderr)
+            pygame.quit()
+            return 1
+        for body in frames.feed(data or b""):
+            view.apply(body)
+
+        screen.fill((20, 20, 20))
+        if view.maze is not None and view.player is not None:
+            if layer.grid is not view.maze:
+                layer.rebuild(view.maze)
+            bbb.camera.follow(view.player, view.maze.shape)
+            layer.draw(screen)
+            bbb.draw_goal(screen, view.exit_cell, pygame.time.get_ticks())
+            for pos in view.enemies:
+                bbb.draw_enemy(screen, pos)
+            bbb.draw_player(screen, view.player)
+        pygame.draw.rect(screen, (50, 50, 50), (0, 0, width, bbb.UI_BAR_HEIGHT))
+        info = f"会话 {view.id}  时间: {view.elapsed_ms() // 1000}s  步数: {view.steps}"
+        if view.outcome == "win":
+            info += "  成功逃脱! (N 新迷宫)"
+        elif view.outcome == "caught":
+            info += "  被追上了! (R 重来, N 新迷宫)"
+        screen.blit(text_cache.render(font, info, (255, 255, 255)), (10, 20))
+        pygame.display.flip()
+        clock.tick(60)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+"""Host many maze games in one process and stream them to thin clients.
+
+    python maze_server.py --port 8765                  # serve on localhost
+    python maze_client.py --port 8765                  # play one session in a window
+    python maze_bots.py -n 1000 --port 8765            # load test with scripted players
+
+Every connection gets its own session: a bbb.GameState with its own maze,
+player and enemies. All sessions share one SimClock and advance together
+on a fixed tick, running the same game logic as the single-player game.
+Sessions whose cooldowns have not run out are skipped on a tick, and
+enemies path over a precomputed distance table of their maze's junction
+graph, so one process keeps up with a thousand or more sessions.
+Mazes are generated ahead of demand on a process pool so that a burst of
+connections or "new maze" requests never stalls the tick.
+
+Wire format: every message is a little-endian u32 length followed by the
+body. The first byte of a body is the message type.
+
+    server -> client
+      HELLO   session id (u32), tick length in ms (u16)
+      MAZE    tick (u32), rows, cols (u16), seed (u64), exit row, col (u16),
+              then one bit per cell, 1 = wall (as in .maze files)
+      DELTA   tick (u32), flags (u8), then only the parts that changed:
+                player  row, col, steps (u16)
+                enemies total (u8), changed (u8), changed x (index u8, row, col u16)
+                status  outcome (u8, index into bbb.OUTCOME_CODES), elapsed ms (u32)
+    client -> server
+      INPUT   action (u8, index into bbb.INPUT_CODES). Directions and None
+              are held until the next INPUT; 'reset' and 'new' happen once.
+
+A DELTA is only sent on ticks where something in the session changed.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import asyncio
+import resource
+import struct
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import bbb
+
+MSG_HELLO, MSG_MAZE, MSG_DELTA, MSG_INPUT = range(4)
+FLAG_PLAYER, FLAG_ENEMIES, FLAG_STATUS = 1, 2, 4
+
+FRAME = struct.Struct("<I")
+HELLO = struct.Struct("<BIH")
+MAZE = struct.Struct("<BIHHQHH")
+DELTA = struct.Struct("<BIB")
+PLAYER = struct.Struct("<HHH")
+ENEMY = struct.Struct("<BHH")
+STATUS = struct.Struct("<BI")
+INPUT = struct.Struct("<BB")
+
+# actions a client may send ('end' only appears in input logs)
+CLIENT_ACTIONS = bbb.INPUT_CODES[:bbb.INPUT_CODES.index("end")]
+# a client whose unsent output grows past this is too slow to keep up and is dropped
+MAX_BACKLOG = 256 * 1024
+
+
+def frame(body):
+    return FRAME.pack(len(body)) + body
+
+
+def encode_input(action):
+    return frame(INPUT.pack(MSG_INPUT, bbb.INPUT_CODES.index(action)))
+
+
+class FrameBuffer:
+    """Splits a byte stream into message bodies, for non-blocking sockets."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def feed(self, data):
+        self.data += data
+        bodies = []
+        pos = 0
+        while len(self.data) - pos >= FRAME.size:
+            (length,) = FRAME.unpack_from(self.data, pos)
+            if len(self.data) - pos - FRAME.size < length:
+                break
+            pos += FRAME.size
+            bodies.append(bytes(self.data[pos:pos + length]))
+            pos += length
+        del self.data[:pos]
+        return bodies
+
+
+class SessionView:
+    """Client-side copy of one session, kept current by apply()."""
+
+    def __init__(self):
+        self.id = None
+        self.tick_ms = bbb.LOGIC_TICK_MS
+        self.tick = 0
+        self.maze = None
+        self.seed = None
+        self.exit_cell = None
+        self.player = None
+        self.steps = 0
+        self.enemies = []
+        self.outcome = None
+        self.elapsed = 0
+        self.status_tick = 0
+
+    def elapsed_ms(self):
+        if self.outcome is None:
+            return self.elapsed + (self.tick - self.status_tick) * self.tick_ms
+        return self.elapsed
+
+    def apply(self, body):
+        """Apply one message body from the server and return its type."""
+        kind = body[0]
+        if kind == MSG_HELLO:
+            _, self.id, self.tick_ms = HELLO.unpack_from(body)
+        elif kind == MSG_MAZE:
+            _, self.tick, rows, cols, self.seed, er, ec = MAZE.unpack_from(body)
+            bits = np.frombuffer(body, np.uint8, offset=MAZE.size)
+            grid = np.unpackbits(bits, count=rows * cols).reshape(rows, cols)
+            grid[er, ec] = 2
+            self.maze, self.exit_cell = grid, (er, ec)
+            # a full DELTA always follows a new maze
+            self.player, self.enemies, self.outcome = None, [], None
+        elif kind == MSG_DELTA:
+            _, self.tick, flags = DELTA.unpack_from(body)
+            pos = DELTA.size
+            if flags & FLAG_PLAYER:
+                r, c, self.steps = PLAYER.unpack_from(body, pos)
+                self.player = (r, c)
+                pos += PLAYER.size
+            if flags & FLAG_ENEMIES:
+                total, changed = body[pos], body[pos + 1]
+                pos += 2
+                del self.enemies[total:]
+                self.enemies += [None] * (total - len(self.enemies))
+                for _ in range(changed):
+                    i, r, c = ENEMY.unpack_from(body, pos)
+                    self.enemies[i] = (r, c)
+                    pos += ENEMY.size
+            if flags & FLAG_STATUS:
+                outcome, self.elapsed = STATUS.unpack_from(body, pos)
+                self.outcome = bbb.OUTCOME_CODES[outcome]
+                self.status_tick = self.tick
+        else:
+            raise ValueError(f"unknown message type {kind}")
+        return kind
+
+
+def prepare_session_maze(*args):
+    """bbb.prepare_maze, plus the distance table that makes enemy moves a few lookups."""
+    prepared = bbb.prepare_maze(*args)
+    graph = prepared[5]
+    if len(graph.adj) <= bbb.GRAPH_TABLE_MAX_NODES:
+        graph.build_table()
+    return prepared
+
+
+class MazeSupply:
+    """Keeps `size` mazes generating on a process pool.
+
+    Works as a GameState prefetcher, but ready() lets the server check
+    whether the next maze is finished before asking for it, so the event
+    loop never waits on generation.
+    """
+
+    def __init__(self, rows, cols, extra_passages, enemy_count, algorithm=None, workers=None, size=64):
+        self.args = (rows, cols, extra_passages, enemy_count, None, algorithm)
+        self.size = size
+        self.executor = ProcessPoolExecutor(workers)
+        self.queue = deque()
+        self.fill()
+
+    def fill(self):
+        while len(self.queue) < self.size:
+            self.queue.append(self.executor.submit(prepare_session_maze, *self.args))
+
+    def matches(self, state):
+        rows, cols, extra_passages, enemy_count, _, algorithm = self.args
+        return ((rows, cols, extra_passages, enemy_count, algorithm)
+                == (state.rows, state.cols, state.extra_passages, state.enemy_count, state.algorithm))
+
+    def ready(self):
+        return bool(self.queue) and self.queue[0].done()
+
+    def get(self):
+        future = self.queue.popleft()
+        self.fill()
+        return future.result()
+
+    def close(self):
+        for future in self.queue:
+            future.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Session:
+    """One player's game on the server, plus what its client has already seen."""
+
+    def __init__(self, sid, writer):
+        self.id = sid
+        self.writer = writer
+        self.state = None
+        self.action = None
+        self.commands = deque()
+        # last values sent to the client; None forces a resend
+        self.maze = None
+        self.player = self.enemies = self.status = None
+
+    def start(self, server):
+        self.state = bbb.GameState(server.rows, server.cols, server.extra_passages, server.enemy_count,
+                                   clock=server.clock, prefetcher=server.supply, algorithm=server.algorithm)
+        # the shared flow field on the junction graph is cheaper per move than a
+        # single enemy's incremental planner, which adds up over many sessions
+        self.state.flow_min_enemies = 1
+
+    def due(self, now):
+        """Whether a step at clock time `now` could change anything.
+
+        Most ticks nobody's cooldown has run out, so most sessions are skipped.
+        """
+        state = self.state
+        if self.commands or state.maze is not self.maze:
+            return True
+        if state.win or state.game_over:
+            return False
+        if self.action in bbb.MOVES and now - state.last_move_time >= state.move_cooldown:
+            # holding a direction into a wall (or off an opening in the border) changes nothing
+            dr, dc = bbb.MOVES[self.action]
+            r, c = state.player_pos[0] + dr, state.player_pos[1] + dc
+            rows, cols = state.maze.shape
+            if 0 <= r < rows and 0 <= c < cols and state.maze[r, c] != 1:
+                return True
+        wake = state.next_update_ms()
+        return wake is not None and now >= wake
+
+    def step(self, supply):
+        # 'new' waits for a finished maze instead of blocking the tick
+        while self.commands and (self.commands[0] != "new" or supply.ready()):
+            self.state.step(self.commands.popleft())
+        self.state.step(self.action)
+
+    def delta(self, tick):
+        """Bytes that bring the client up to date (empty if nothing changed)."""
+        state = self.state
+        out = bytearray()
+        if state.maze is not self.maze:
+            self.maze = state.maze
+            self.player = self.enemies = self.status = None
+            grid = bbb.as_grid(state.maze)
+            out += frame(MAZE.pack(MSG_MAZE, tick, *grid.shape, state.seed, *state.exit_cell)
+                         + np.packbits(grid == 1).tobytes())
+        flags = 0
+        body = bytearray()
+        player = (state.player_pos[0], state.player_pos[1], min(state.steps, 0xFFFF))
+        if player != self.player:
+            flags |= FLAG_PLAYER
+            body += PLAYER.pack(*player)
+            self.player = player
+        enemies = [enemy.pos for enemy in state.enemies]
+        if enemies != self.enemies:
+            old = self.enemies or []
+            changed = [(i, pos) for i, pos in enumerate(enemies) if i >= len(old) or old[i] != pos]
+            flags |= FLAG_ENEMIES
+            body += bytes((len(enemies), len(changed)))
+            for i, (r, c) in changed:
+                body += ENEMY.pack(i, r, c)
+            self.enemies = enemies
+        outcome = bbb.OUTCOME_CODES.index("win" if state.win else "caught" if state.game_over else None)
+        status = (outcome, state.start_time)
+        if status != self.status:
+            flags |= FLAG_STATUS
+            body += STATUS.pack(outcome, state.elapsed_ms())
+            self.status = status
+        if flags:
+            out += frame(DELTA.pack(MSG_DELTA, tick, flags) + body)
+        return out
+
+
+class MazeServer:
+    """Accepts connections and advances every session on one shared tick."""
+
+    def __init__(self, rows=31, cols=41, extra_passages=120, enemy_count=1, algorithm=None,
+                 tick_ms=bbb.LOGIC_TICK_MS, workers=None, prefetch=64, max_sessions=5000):
+        if not 0 <= enemy_count <= 255:
+            raise ValueError("the protocol carries at most 255 enemies per session")
+        if not (0 < rows <= 0xFFFF and 0 < cols <= 0xFFFF):
+            raise ValueError("the protocol carries at most 65535 rows and columns")
+        self.rows, self.cols = rows, cols
+        self.extra_passages = extra_passages
+        self.enemy_count = enemy_count
+        self.algorithm = algorithm or bbb.MAZE_ALGORITHM
+        self.tick_ms = tick_ms
+        self.max_sessions = max_sessions
+        self.clock = bbb.SimClock()
+        self.tick = 0
+        self.supply = MazeSupply(rows, cols, extra_passages, enemy_count, self.algorithm, workers, prefetch)
+        self.sessions = {}
+        # sessions still waiting for their first maze, in connection order
+        self.waiting = deque()
+        self.next_id = 1
+        self.stats = {"ticks": 0, "tick_ms": 0.0, "max_ms": 0.0, "late": 0, "bytes": 0, "messages": 0}
+
+    async def handle(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            writer.close()
+            return
+        session = Session(self.next_id, writer)
+        self.next_id += 1
+        self.sessions[session.id] = session
+        self.waiting.append(session)
+        writer.write(frame(HELLO.pack(MSG_HELLO, session.id, self.tick_ms)))
+        try:
+            while True:
+                (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+                # clients only send INPUT; anything longer is not read into memory
+                if length != INPUT.size:
+                    break
+                body = await reader.readexactly(length)
+                if body[0] != MSG_INPUT or body[1] >= len(CLIENT_ACTIONS):
+                    break
+                action = CLIENT_ACTIONS[body[1]]
+                if action in ("reset", "new"):
+                    session.commands.append(action)
+                else:
+                    session.action = action
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.pop(session.id, None)
+            writer.close()
+
+    def drop(self, session):
+        """Disconnect a session whose game raised; one broken session must not stop the tick for the rest."""
+        print(f"session {session.id} failed and was dropped:", file=sys.stderr)
+        traceback.print_exc()
+        self.sessions.pop(session.id, None)
+        session.writer.transport.abort()
+
+    def step(self):
+        """Run one tick for every session and queue their deltas."""
+        self.clock.advance(self.tick_ms)
+        self.tick += 1
+        while self.waiting and self.supply.ready():
+            session = self.waiting.popleft()
+            if session.id in self.sessions:
+                try:
+                    session.start(self)
+                except Exception:
+                    self.drop(session)
+        now = self.clock()
+        sent = messages = 0
+        for session in list(self.sessions.values()):
+            if session.state is None or not session.due(now):
+                continue
+            try:
+                session.step(self.supply)
+                out = session.delta(self.tick)
+            except Exception:
+                self.drop(session)
+                continue
+            if out:
+                transport = session.writer.transport
+                if transport.is_closing():
+                    continue
+                if transport.get_write_buffer_size() > MAX_BACKLOG:
+                    transport.abort()
+                    continue
+                session.writer.write(out)
+                sent += len(out)
+                messages += 1
+        self.stats["bytes"] += sent
+        self.stats["messages"] += messages
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        tick_s = self.tick_ms / 1000
+        deadline = loop.time()
+        while True:
+            t = time.perf_counter()
+            self.step()
+            elapsed = (time.perf_counter() - t) * 1000
+            stats = self.stats
+            stats["ticks"] += 1
+            stats["tick_ms"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+            # fixed schedule; if a tick runs late the next ones start right away to catch up
+            deadline += tick_s
+            delay = deadline - loop.time()
+            if delay < 0:
+                stats["late"] += 1
+                if delay < -tick_s * bbb.MAX_LOGIC_STEPS:
+                    deadline = loop.time()
+            await asyncio.sleep(max(0, delay))
+
+    async def report(self, every):
+        while True:
+            await asyncio.sleep(every)
+            stats = self.stats
+            ticks = max(1, stats["ticks"])
+            print(f"{len(self.sessions)} sessions ({len(self.waiting)} waiting), tick {self.tick}: "
+                  f"{stats['tick_ms'] / ticks:.2f} ms mean, {stats['max_ms']:.2f} ms max, {stats['late']} late, "
+                  f"{stats['messages'] / every:.0f} msg/s, {stats['bytes'] / every / 1024:.1f} KiB/s",
+                  file=sys.stderr)
+            self.stats = dict.fromkeys(stats, 0)
+
+
+def raise_fd_limit():
+    """Each session holds a socket; lift the soft descriptor limit as far as allowed."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def serve(args):
+    server = MazeServer(args.rows, args.cols, args.extra, args.enemies, args.algorithm, args.tick_ms,
+                        args.workers, args.prefetch, args.max_sessions)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, args.unix, backlog=1024)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port, backlog=1024)
+        where = f"{args.host}:{args.port}"
+    print(f"Serving {args.rows}x{args.cols} mazes on {where}, {args.tick_ms} ms ticks", file=sys.stderr)
+    try:
+        async with listener:
+            await asyncio.gather(server.run(), server.report(args.report))
+    finally:
+        server.supply.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve many concurrent maze sessions to local clients.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--rows", type=int, default=bbb.MAZE_ROWS)
+    parser.add_argument("--cols", type=int, default=bbb.MAZE_COLS)
+    parser.add_argument("--extra", type=int, default=120, help="extra_passages per maze")
+    parser.add_argument("--enemies", type=int, default=bbb.ENEMY_COUNT)
+    parser.add_argument("--algorithm", choices=bbb.MAZE_ALGORITHMS, default=bbb.MAZE_ALGORITHM)
+    parser.add_argument("--tick-ms", type=int, default=bbb.LOGIC_TICK_MS)
+    parser.add_argument("--workers", type=int, help="maze generation processes (default: one per CPU)")
+    parser.add_argument("--prefetch", type=int, default=64, help="mazes kept generating ahead of demand")
+    parser.add_argument("--max-sessions", type=int, default=5000)
+    parser.add_argument("--report", type=float, default=5.0, help="seconds between stats lines on stderr")
+    args = parser.parse_args(argv)
+
+    raise_fd_limit()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
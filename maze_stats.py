@@ -0,0 +1,185 @@
+"""Statistics over many generated mazes, for tuning sizes and extra_passages.
+
+    python maze_stats.py -n 1000 --sizes 31x41 101x101 --extra 0 60 120 -o stats.jsonl
+    python maze_stats.py -n 1000000 --no-chase --workers 16 > stats.jsonl
+
+Mazes are generated on a process pool and written as one JSON line each,
+in completion order, so memory use does not grow with -n. Maze i of a
+(size, extra) group always gets the same seed, whatever the worker count.
+A summary per group goes to stderr.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+import bbb
+
+
+def parse_size(text):
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+
+def maze_seed(base, rows, cols, extra, index):
+    """63-bit seed for maze `index` of a group, independent of scheduling."""
+    state = np.random.SeedSequence([base, rows, cols, extra, index]).generate_state(2, np.uint32)
+    return (int(state[0]) << 31) ^ int(state[1])
+
+
+def exit_runner(state):
+    """Bot policy: always step along a shortest path to the exit."""
+    flow = state.runner_flow
+    flow.update(state.maze, state.exit_cell)
+    r, c = flow.next_step(tuple(state.player_pos))
+    for action, (dr, dc) in bbb.MOVES.items():
+        if (state.player_pos[0] + dr, state.player_pos[1] + dc) == (r, c):
+            return action
+    return None
+
+
+class Prepared:
+    """Stands in for a GameState prefetcher and hands over one maze that is already built."""
+
+    def __init__(self, maze):
+        self.maze = maze
+
+    def matches(self, state):
+        return True
+
+    def get(self):
+        return self.maze
+
+
+def analyze(job):
+    """Generate one maze and return its statistics as a dict."""
+    rows, cols, extra, seed, enemies, chase, max_ticks, algorithm = job
+    t = time.perf_counter()
+    prepared = bbb.prepare_maze(rows, cols, extra, enemies, seed, algorithm)
+    maze, player_pos, exit_cell, spawns, seed, graph = prepared
+    gen_ms = (time.perf_counter() - t) * 1000
+
+    to_exit = bbb.FlowField()
+    to_exit.update(maze, exit_cell)
+    exit_distance = to_exit.distance(tuple(player_pos))
+
+    free = bbb.open_mask(maze)
+    degree = bbb.neighbor_counts(maze)[free]
+    cells = int(free.sum())
+    links = int((free[1:, :] & free[:-1, :]).sum() + (free[:, 1:] & free[:, :-1]).sum())
+    junctions = degree >= 3
+    edges = [edge for edge in graph.edges if edge is not None]
+    record = {
+        "rows": int(maze.shape[0]),
+        "cols": int(maze.shape[1]),
+        "extra_passages": extra,
+        "algorithm": algorithm,
+        "seed": seed,
+        "exit": list(exit_cell),
+        "exit_distance": exit_distance,
+        "open_cells": cells,
+        "dead_ends": int(bbb.dead_ends(maze).sum()),
+        # independent cycles of the (connected) open-cell graph: E - V + 1
+        "loops": links - cells + 1,
+        "junctions": int(junctions.sum()),
+        "branching": round(float(degree[junctions].mean()), 4) if junctions.any() else 0.0,
+        "graph_nodes": len(graph.adj),
+        "mean_corridor": round(sum(len(edge[2]) + 1 for edge in edges) / len(edges), 4) if edges else 0.0,
+        "gen_ms": round(gen_ms, 3),
+    }
+    if chase:
+        # the chase runs on the maze measured above instead of generating it again from the seed
+        state = bbb.GameState(rows, cols, extra, enemies, clock=bbb.SimClock(), prefetcher=Prepared(prepared),
+                              algorithm=algorithm)
+        # the runner heads for the exit, so it reuses the exit distance field
+        state.runner_flow = to_exit
+        result = bbb.run_episode(state, exit_runner, bbb.LOGIC_TICK_MS, max_ticks)
+        record["chase"] = result or "timeout"
+        record["chase_steps"] = state.steps
+    return record
+
+
+def jobs(args, rows, cols, extra, start, stop):
+    chase = not args.no_chase
+    for i in range(start, stop):
+        seed = maze_seed(args.seed, rows, cols, extra, i)
+        yield rows, cols, extra, seed, args.enemies, chase, args.max_ticks, args.algorithm
+
+
+class Summary:
+    """Running means per (size, extra) group, in constant memory."""
+
+    FIELDS = ("exit_distance", "dead_ends", "loops", "branching", "mean_corridor", "gen_ms")
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, record):
+        key = (record["rows"], record["cols"], record["extra_passages"])
+        group = self.groups.setdefault(key, dict.fromkeys(self.FIELDS + ("count", "caught", "chased"), 0))
+        group["count"] += 1
+        for field in self.FIELDS:
+            group[field] += record[field]
+        if "chase" in record:
+            group["chased"] += 1
+            group["caught"] += record["chase"] == "caught"
+
+    def report(self, out):
+        for (rows, cols, extra), group in sorted(self.groups.items()):
+            n = group["count"]
+            means = "  ".join(f"{field} {group[field] / n:.2f}" for field in self.FIELDS)
+            catch = f"  catch_rate {group['caught'] / group['chased']:.3f}" if group["chased"] else ""
+            print(f"{rows}x{cols} extra={extra} n={n}  {means}{catch}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate many mazes in parallel and stream their statistics as JSONL.")
+    parser.add_argument("-n", "--count", type=int, default=100, help="mazes per size/extra combination")
+    parser.add_argument("--sizes", nargs="+", default=["31x41"], help="maze sizes as ROWSxCOLS")
+    parser.add_argument("--extra", nargs="+", type=int, default=[120], help="extra_passages values")
+    parser.add_argument("--seed", type=int, default=0, help="base seed")
+    parser.add_argument("--algorithm", choices=bbb.MAZE_ALGORITHMS, default=bbb.MAZE_ALGORITHM,
+                        help="maze generator")
+    parser.add_argument("--enemies", type=int, default=1)
+    parser.add_argument("--no-chase", action="store_true", help="skip the chase simulation (much faster)")
+    parser.add_argument("--max-ticks", type=int, default=20000, help="chase simulation limit per maze")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("-o", "--output", help="write JSONL here instead of stdout")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    summary = Summary()
+    start = time.perf_counter()
+    # submit in batches so the task queue stays small for very large -n
+    batch = max(1, args.workers) * args.chunksize * 4
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            for size, extra in itertools.product(args.sizes, args.extra):
+                rows, cols = parse_size(size)
+                for first in range(0, args.count, batch):
+                    work = jobs(args, rows, cols, extra, first, min(first + batch, args.count))
+                    for record in pool.imap_unordered(analyze, work, args.chunksize):
+                        out.write(json.dumps(record) + "\n")
+                        summary.add(record)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    summary.report(sys.stderr)
+    print(f"{sum(g['count'] for g in summary.groups.values())} mazes in {time.perf_counter() - start:.2f} s",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
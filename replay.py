@@ -0,0 +1,43 @@
+"""Replay recorded sessions headlessly at full speed.
+
+    python bbb.py --record run.inp                # play and record a session
+    python bbb.py --replay run.inp                # watch it again in the window
+    python replay.py run.inp logs/*.inp           # replay many, check the results
+
+Every log ends with the outcome and step count of the recorded session;
+replay.py exits with 1 if any replay ends differently.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import sys
+import time
+
+import bbb
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded maze sessions headlessly.")
+    parser.add_argument("logs", nargs="+", help="input logs written by bbb.py --record")
+    parser.add_argument("--max-ticks", type=int, help="stop each replay after this many ticks")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    start = time.perf_counter()
+    for path in args.logs:
+        log = bbb.InputLog.load(path)
+        state, ticks, matches = bbb.replay_log(log, args.max_ticks)
+        outcome = "win" if state.win else "caught" if state.game_over else "-"
+        status = {True: "ok", False: "MISMATCH", None: "no result"}[matches]
+        print(f"{path}: {ticks} ticks, {outcome}, {state.steps} steps, {status}")
+        failed += matches is False
+    elapsed = time.perf_counter() - start
+    print(f"{len(args.logs)} replays in {elapsed:.2f} s, {failed} mismatched", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())